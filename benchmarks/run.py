@@ -0,0 +1,118 @@
+'''
+Run the benchmark suites of both projects, store the timings as JSON and compare them to a baseline.
+Both projects import their code as the package `src`, so each suite runs in its own process from its folder.
+Everything runs offline on synthetic data.
+
+    python benchmarks/run.py                       # run, write benchmarks/results/<time>.json, compare to baseline
+    python benchmarks/run.py --save-baseline       # run and make the results the baseline of this machine
+    python benchmarks/run.py --quick --repeat 2    # smoke test
+
+Exit status 1 when a case is slower than the baseline by more than the threshold.
+'''
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HERE = os.path.join(ROOT, 'benchmarks')
+PROJECTS = ['microprice', 'combined-markets']
+BASELINE = os.path.join(HERE, 'baseline.json')
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+def _meta():
+    code = 'import json, numpy, scipy, pandas; print(json.dumps({m.__name__: m.__version__ for m in [numpy, scipy, pandas]}))'
+    versions = json.loads(subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout)
+    return {'time':time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit':_git_commit(), 'python':platform.python_version(),
+            'platform':platform.platform(), 'machine':platform.machine(), 'cpus':os.cpu_count(), 'versions':versions}
+
+def run(projects=PROJECTS, quick=False, repeat=5):
+    ''' {project/case: timing} of every suite. '''
+    results = {}
+    for project in projects:
+        cmd = [sys.executable, '-m', 'benchmarks.suite', '--repeat', str(repeat)] + (['--quick'] if quick else [])
+        print(f'running {project} ...', file=sys.stderr)
+        out = subprocess.run(cmd, cwd=os.path.join(ROOT, project), capture_output=True, text=True)
+        if out.returncode != 0:
+            raise RuntimeError(f'{project} suite failed:\n{out.stderr}')
+        results.update({f'{project}/{name}': t for name, t in json.loads(out.stdout).items()})
+    return results
+
+def compare(results, baseline, threshold=0.25, min_time=1e-3, stat='median'):
+    '''
+    Rows (case, baseline, current, ratio, status) of the cases in both. A case regresses when current / baseline
+    exceeds 1 + threshold and the difference is above min_time [s], sub-millisecond noise is not flagged.
+    '''
+    rows = []
+    for name in sorted(set(results) | set(baseline)):
+        if name not in results or name not in baseline:
+            rows.append((name, baseline.get(name, {}).get(stat), results.get(name, {}).get(stat), None,
+                         'new' if name in results else 'missing'))
+            continue
+        old, new = baseline[name][stat], results[name][stat]
+        ratio = new / old if old > 0 else float('inf')
+        if ratio > 1 + threshold and new - old > min_time:
+            status = 'SLOWER'
+        elif ratio < 1 / (1 + threshold) and old - new > min_time:
+            status = 'faster'
+        else:
+            status = 'ok'
+        rows.append((name, old, new, ratio, status))
+    return rows
+
+def _fmt(x, spec):
+    return format(x, spec) if x is not None else '-'
+
+def print_comparison(rows):
+    width = max([len(r[0]) for r in rows] + [4])
+    print('{:<{w}} {:>12} {:>12} {:>7} {:>8}'.format('case', 'baseline [s]', 'current [s]', 'ratio', 'status', w=width))
+    for name, old, new, ratio, status in rows:
+        print('{:<{w}} {:>12} {:>12} {:>7} {:>8}'.format(name, _fmt(old, '.5f'), _fmt(new, '.5f'), _fmt(ratio, '.2f'),
+                                                         status, w=width))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--projects', nargs='+', default=PROJECTS, choices=PROJECTS)
+    parser.add_argument('--quick', action='store_true', help='small inputs, for smoke tests')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--out', help='results file, default benchmarks/results/<time>.json')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='write the results to --baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed relative slowdown')
+    parser.add_argument('--min-time', type=float, default=1e-3, help='ignore differences below this [s]')
+    args = parser.parse_args(argv)
+
+    report = {'meta':dict(_meta(), quick=args.quick, repeat=args.repeat), 'results':run(args.projects, args.quick, args.repeat)}
+    out = args.out or os.path.join(HERE, 'results', time.strftime('%Y%m%dT%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=1)
+    print(f'results written to {out}', file=sys.stderr)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=1)
+        print(f'baseline written to {args.baseline}', file=sys.stderr)
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f'no baseline at {args.baseline}, create one with --save-baseline', file=sys.stderr)
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline['meta'].get('quick') != args.quick:
+        print('warning: baseline and results differ in --quick, sizes are not comparable', file=sys.stderr)
+    baseline = {k: v for k, v in baseline['results'].items() if k.split('/')[0] in args.projects}
+    rows = compare(report['results'], baseline, args.threshold, args.min_time)
+    print_comparison(rows)
+    return 1 if any(r[4] == 'SLOWER' for r in rows) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
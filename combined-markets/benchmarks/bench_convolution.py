@@ -0,0 +1,30 @@
+'''
+Benchmark market.uniform_convolution at BTC prices, exact piecewise polynomial vs local grid density.
+Run from the combined-markets folder: python -m benchmarks.bench_convolution
+'''
+import time
+import numpy as np
+
+import src.market as mkt
+from benchmarks import synthetic
+
+def main(n_venues=(2, 4, 8, 12, 32)):
+    print('{:>8} {:>8} {:>12} {:>12} {:>10} {:>12}'.format('venues', 'points', 'exact [s]', 'grid [s]', 'max diff', 'cached [s]'))
+    for n in n_venues:
+        bids, asks = synthetic.venues(1, n)
+        markets = [mkt.Market(b, a) for b, a in zip(bids[0], asks[0])]
+        weights = 1 / (asks[0] - bids[0])**2
+        mkt._convolution.cache_clear()
+        t0 = time.perf_counter()
+        x, exact = mkt.uniform_convolution(markets, weights, method='exact') if n <= mkt.MAX_EXACT else (None, None)
+        t1 = time.perf_counter()
+        x, grid = mkt.uniform_convolution(markets, weights, method='grid')
+        t2 = time.perf_counter()
+        mkt.uniform_convolution(markets, weights, method='grid')
+        t3 = time.perf_counter()
+        assert abs(np.trapz(grid, x) - 1) < 1e-3
+        diff = np.abs(exact - grid).max() / exact.max() if exact is not None else np.nan
+        print('{:>8} {:>8} {:>12.4f} {:>12.4f} {:>10.2e} {:>12.6f}'.format(n, len(x), t1 - t0, t2 - t1, diff, t3 - t2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+'''
+Benchmark market_estimation estimators, (T x N) array versions vs the list-of-Market API per snapshot.
+Run from the combined-markets folder: python -m benchmarks.bench_estimators
+'''
+import time
+import numpy as np
+
+import src.market_estimation as me
+from benchmarks import synthetic
+
+ESTIMATORS = {
+    'kalman': (lambda b, a: me.kalman_batch(b, a)[0], lambda ms: me.kalman(ms).mean()),
+    'rewl': (lambda b, a: me.rewl_batch(b, a)[0], lambda ms: me.rewl(ms).mean()),
+    'varw': (lambda b, a: me.varw_batch(b, a), lambda ms: me.varw(ms)),
+    'dw_varw': (lambda b, a: me.dw_varw_batch(b, a), lambda ms: me.dw_varw(ms)),
+    'dwm': (lambda b, a: me.dwm_batch(b, a), lambda ms: me.dwm(ms)),
+}
+
+def distance_scaling(n_venues=(8, 64, 512), n_times=1000):
+    ''' market_estimation.distance_sums, sorted prefix sums (p=1) vs all pairs broadcasting (p=2). '''
+    print('{:>8} {:>10} {:>14} {:>14}'.format('venues', 'snapshots', 'p=1 sort [s]', 'p=2 pairs [s]'))
+    for n in n_venues:
+        mids = np.mean(synthetic.venues(n_times, n), axis=0)
+        t0 = time.perf_counter()
+        me.distance_sums(mids, p=1)
+        t1 = time.perf_counter()
+        me.distance_sums(mids, p=2)
+        t2 = time.perf_counter()
+        print('{:>8} {:>10} {:>14.4f} {:>14.4f}'.format(n, n_times, t1 - t0, t2 - t1))
+
+def mode_bootstrap(n_times=1000, n_venues=8, nsim=1000, n_jobs=(1, 4)):
+    ''' market_estimation.modest_batch(dispersion='bootstrap'), nsim resamples per snapshot. '''
+    bids, asks = synthetic.venues(n_times, n_venues)
+    print('{:>8} {:>10} {:>8} {:>8} {:>12}'.format('venues', 'snapshots', 'nsim', 'jobs', 'time [s]'))
+    for jobs in n_jobs:
+        t0 = time.perf_counter()
+        me.modest_batch(bids, asks, 'bootstrap', nsim=nsim, seed=0, n_jobs=jobs)
+        print('{:>8} {:>10} {:>8} {:>8} {:>12.4f}'.format(n_venues, n_times, nsim, jobs, time.perf_counter() - t0))
+
+def main(n_times=(1000, 100000), n_venues=8, n_loop=1000):
+    ''' The list API is timed on n_loop snapshots and extrapolated to n_times. '''
+    print('{:>8} {:>8} {:>10} {:>12} {:>12} {:>8}'.format('est', 'venues', 'snapshots', 'list [s]', 'batch [s]', 'speedup'))
+    for n in n_times:
+        bids, asks = synthetic.venues(n, n_venues)
+        mkts = synthetic.markets(bids[:n_loop], asks[:n_loop])
+        for name, (batch, single) in ESTIMATORS.items():
+            t0 = time.perf_counter()
+            ref = np.array([single(ms) for ms in mkts])
+            t_list = (time.perf_counter() - t0) * n / len(mkts)
+            t0 = time.perf_counter()
+            res = batch(bids, asks)
+            t_batch = time.perf_counter() - t0
+            np.testing.assert_allclose(res[:len(mkts)], ref, rtol=1e-12)
+            print('{:>8} {:>8} {:>10} {:>12.4f} {:>12.4f} {:>8.1f}x'.format(name, n_venues, n, t_list, t_batch, t_list / t_batch))
+    distance_scaling()
+    mode_bootstrap()
+
+if __name__ == '__main__':
+    main()
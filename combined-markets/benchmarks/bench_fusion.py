@@ -0,0 +1,44 @@
+'''
+Throughput of market_estimation.OnlineFusion on replayed multi-venue ticks, vs refitting
+online_kalman on the latest markets after every tick.
+Run from the combined-markets folder: python -m benchmarks.bench_fusion
+'''
+import time
+import numpy as np
+
+import src.market_estimation as me
+from src.market import Market
+from benchmarks import synthetic
+
+def _replay(fusion, ticks, query):
+    for v, t, b, a in zip(*(x.tolist() for x in ticks)):
+        fusion.update(v, b, a, t)
+        if query:
+            fusion.estimate(t)
+    return fusion
+
+def main(n_ticks=200000, n_venues=(8, 64), n_refit=20000):
+    print('{:>8} {:>10} {:>14} {:>14} {:>14}'.format('venues', 'halflife', 'update [1/s]', '+query [1/s]', 'refit [1/s]'))
+    for n in n_venues:
+        ticks = synthetic.ticks(n_ticks, n)
+        # reference: online_kalman refit over the latest market of each venue
+        latest = {}
+        t0 = time.perf_counter()
+        for v, t, b, a in zip(*(x[:n_refit].tolist() for x in ticks)):
+            latest[v] = Market(b, a)
+            ref = me.online_kalman(list(latest.values()))
+        refit = n_refit / (time.perf_counter() - t0)
+        fusion = _replay(me.OnlineFusion(), [x[:n_refit] for x in ticks], query=False)
+        mean, var = fusion.estimate()
+        np.testing.assert_allclose([mean, var], [ref.mean(), ref.var()], rtol=1e-9)
+
+        for halflife in [None, 1.0]:
+            t0 = time.perf_counter()
+            _replay(me.OnlineFusion(halflife), ticks, query=False)
+            t1 = time.perf_counter()
+            _replay(me.OnlineFusion(halflife), ticks, query=True)
+            t2 = time.perf_counter()
+            print('{:>8} {:>10} {:>14,.0f} {:>14,.0f} {:>14,.0f}'.format(n, str(halflife), n_ticks / (t1 - t0), n_ticks / (t2 - t1), refit))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+'''
+Benchmark suite of the market estimators and uniform_convolution on synthetic venues, timings as JSON on stdout.
+Run from the combined-markets folder: python -m benchmarks.suite [--quick] [--repeat 5]
+Usually run through benchmarks/run.py at the repository root, which stores and compares results.
+'''
+import sys
+import json
+import time
+import argparse
+import warnings
+import numpy as np
+
+import src.market as mkt
+import src.market_estimation as me
+from benchmarks import synthetic
+
+def timeit(fn, repeat):
+    ''' min, median and mean wall time [s] of repeat calls of fn. '''
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return {'min':min(times), 'median':float(np.median(times)), 'mean':float(np.mean(times)), 'repeat':repeat}
+
+def _convolution(markets, weights, method):
+    mkt._convolution.cache_clear() # time the computation, not the cache
+    return mkt.uniform_convolution(markets, weights, method=method)
+
+def cases(n_times=100000, n_venues=(4, 16, 64), n_markets=(2, 8, 32), n_list=1000, seed=0):
+    ''' (name, fn) of every timed call, inputs are prepared outside fn. '''
+    for n in n_venues:
+        b, a = synthetic.venues(n_times, n, seed=seed)
+        yield f'kalman_batch/N={n}', lambda b=b, a=a: me.kalman_batch(b, a)
+        yield f'rewl_batch/N={n}', lambda b=b, a=a: me.rewl_batch(b, a)
+        yield f'varw_batch/N={n}', lambda b=b, a=a: me.varw_batch(b, a)
+        yield f'dw_varw_batch/N={n}', lambda b=b, a=a: me.dw_varw_batch(b, a)
+        yield f'dwm_batch/N={n}', lambda b=b, a=a: me.dwm_batch(b, a)
+        yield f'modest_batch/bidask/N={n}', lambda b=b, a=a: me.modest_batch(b, a, 'bidask')
+        markets = synthetic.markets(b[:n_list], a[:n_list])
+        yield f'kalman/list/N={n}', lambda ms=markets: [me.kalman(m) for m in ms]
+        yield f'dwm/list/N={n}', lambda ms=markets: [me.dwm(m) for m in ms]
+    for n in n_markets:
+        b, a = synthetic.venues(1, n, seed=seed)
+        markets = [mkt.Market(x, y) for x, y in zip(b[0], a[0])]
+        weights = 1 / (a[0] - b[0])**2
+        for method in ['auto', 'grid']:
+            yield f'uniform_convolution/{method}/N={n}', lambda ms=markets, w=weights, m=method: _convolution(ms, w, m)
+
+def run(repeat=5, **kwargs):
+    return {name: timeit(fn, repeat) for name, fn in cases(**kwargs)}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help='small inputs, for smoke tests')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--snapshots', type=int, help='number of snapshots of the batch estimators')
+    args = parser.parse_args(argv)
+    n_times = args.snapshots or (1000 if args.quick else 100000)
+    warnings.simplefilter('ignore')
+    results = run(args.repeat, n_times=n_times, n_list=min(n_times, 1000))
+    json.dump(results, sys.stdout, indent=1)
+
+if __name__ == '__main__':
+    main()
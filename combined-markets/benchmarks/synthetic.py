@@ -0,0 +1,33 @@
+import numpy as np
+
+def venues(n_times=100000, n_venues=8, price0=50000.0, vol=5.0, ticksize=0.5,
+           spread_ticks=(1, 2, 4, 10), noise=2.0, seed=0):
+    '''
+    Synthetic quotes of n_venues markets on one instrument, (T, N) bid and ask arrays.
+    The fair price is a gaussian random walk (vol per step), each venue quotes around it with its own
+    offset noise and a spread drawn from spread_ticks (fixed per venue), snapped to the tick grid.
+    '''
+    rng = np.random.default_rng(seed)
+    fair = price0 + np.cumsum(rng.normal(0.0, vol, n_times))
+    half = 0.5 * ticksize * rng.choice(spread_ticks, size=n_venues)
+    mid = fair[:, None] + rng.normal(0.0, noise, (n_times, n_venues))
+    bids = np.floor((mid - half) / ticksize) * ticksize
+    asks = np.maximum(np.ceil((mid + half) / ticksize) * ticksize, bids + ticksize)
+    return bids, asks
+
+def markets(bids, asks):
+    ''' List of Market per snapshot, the input of the list API. '''
+    from src.market import Market
+    return [[Market(b, a) for b, a in zip(bs, as_)] for bs, as_ in zip(bids, asks)]
+
+def ticks(n_ticks=1000000, n_venues=8, rate=1000.0, seed=0, **kwargs):
+    '''
+    Asynchronous multi-venue replay: venue (int), time [s] (poisson arrivals at rate per second) and
+    the venue's new bid and ask, drawn from venues(n_ticks, n_venues, seed=seed, **kwargs) at the tick's venue.
+    '''
+    rng = np.random.default_rng(seed + 1)
+    bids, asks = venues(n_ticks, n_venues, seed=seed, **kwargs)
+    venue = rng.integers(0, n_venues, n_ticks)
+    t = np.cumsum(rng.exponential(1 / rate, n_ticks))
+    rows = np.arange(n_ticks)
+    return venue, t, bids[rows, venue], asks[rows, venue]
@@ -3,54 +3,104 @@ import numpy as np
 
 from scipy import signal
 import functools
-def uniform_convolution(markets, weights=None):
-    if weights is None:
-        weights = np.ones(len(markets))
-    lamb = weights / weights.sum()    
+import itertools
+import math
+
+MAX_EXACT = 12 # markets of the exact density, 2^n corner terms per point.
 
-        # scaling causes x_i_new = x/w_i
-    #xmin, xmax = min([m.bid/lam for m,lam in zip(markets, lamb)]), max([m.ask/lam for m,lam in zip(markets, lamb)])
-    xmin = min(min(m.bid for m in markets), sum([m.bid*la for m,la in zip(markets,lamb)]))
-    xmax = max(max(m.ask for m in markets), sum([m.ask*la for m,la in zip(markets,lamb)]))
+def _uniform_sum_exact(x, widths, block=2**22):
+    '''
+    Density of S = sum_i w_i U_i, U_i ~ U(0, 1), evaluated at x (Irwin-Hall generalized to unequal widths):
+    f(x) = sum_{e in {0,1}^n} (-1)^|e| (x - e.w)_+^(n-1) / ((n-1)! prod(w)).
+    Computed on x / sum(w) and w / sum(w) to keep the terms of order one, corners are summed in
+    blocks of about block terms to bound memory. At most MAX_EXACT widths.
+    '''
+    n, tot = len(widths), widths.sum()
+    if n > MAX_EXACT:
+        raise ValueError(f'The exact density supports up to {MAX_EXACT} markets with a spread, got {n}.')
+    w, x = widths / tot, np.asarray(x, dtype=float) / tot
+    if n == 1: # the corner terms are 0**0 on both sides and would cancel
+        return ((x >= 0) & (x <= 1)) / tot
+    corners = np.array(list(itertools.product([0, 1], repeat=n)))
+    signs = (-1.0) ** corners.sum(axis=1)
+    offsets = corners @ w
+    pdf = np.zeros(len(x))
+    step = max(1, block // max(len(x), 1))
+    for i in range(0, len(offsets), step):
+        terms = np.clip(x[None, :] - offsets[i:i + step, None], 0.0, None) ** (n - 1)
+        pdf += signs[i:i + step] @ terms
+    pdf /= math.factorial(n - 1) * np.prod(w)
+    pdf[(x < 0) | (x > 1)] = 0.0
+    return np.clip(pdf, 0.0, None) / tot
 
-    delta = 1e-4
-    xmin, xmax = xmin-2*delta, xmax+2*delta # extend a bit to cover points on the limit
-    xlim = max(xmin, xmax) # make symmetric, otherwise convolution gets offsetted, not sure how to fix.
-    big_grid = np.arange(-xlim, xlim, delta)
+def _exact_error(widths):
+    ''' Rough relative round-off of _uniform_sum_exact, 2^n cancelling terms of order one. '''
+    w = widths / widths.sum()
+    n = len(w)
+    return np.finfo(float).eps * 2.0**n / (math.factorial(n - 1) * np.prod(w))
 
-    pmfs = [m.uniform().pdf(big_grid)*delta for m in markets]
-    # if Y = w*X, then f_Y(y) = f_X(y/w)*1/w. 
-    wpmfs = [m.uniform().pdf(big_grid/lam)*delta/lam for m,lam in zip(markets, lamb)]
-    conv_pmf = functools.reduce(lambda pmf1,pmf2: signal.fftconvolve(pmf1,pmf2,'same'), wpmfs)
+def _uniform_sum_grid(x, widths, points_per_width=64, max_points=2**20):
+    '''
+    Density of S = sum_i w_i U_i by convolution on a lattice local to the support [0, sum(w)],
+    step chosen so the narrowest uniform spans points_per_width lattice cells.
+    '''
+    tot = widths.sum()
+    h = max(widths.min() / points_per_width, tot / max_points)
+    pmfs = []
+    for w in widths: # mass of [(k - 1/2) h, (k + 1/2) h) for lattice points k h
+        edges = (np.arange(int(np.ceil(w / h)) + 2) - 0.5) * h
+        pmfs.append(np.diff(np.clip(edges / w, 0.0, 1.0)))
+    pmf = functools.reduce(lambda pmf1, pmf2: signal.fftconvolve(pmf1, pmf2, 'full'), pmfs)
+    lattice = np.arange(len(pmf)) * h
+    return np.interp(x, lattice, np.clip(pmf, 0.0, None) / h, left=0.0, right=0.0)
 
-    pdfs = [f/delta for f in pmfs]
-    wpdfs = [f/delta for f in wpmfs]
-    conv_pdf = conv_pmf/delta
-    #Integration of convoluted pdf: 
-    area = np.trapz(conv_pdf, big_grid)
-    assert np.abs(area-1)<0.025, "Integrated pdf does not integrate up to 1."
+@functools.lru_cache(maxsize=256)
+def _convolution(bids, asks, lamb, method, n_points):
+    bids, asks, lamb = np.array(bids), np.array(asks), np.array(lamb)
+    xmin = min(bids.min(), (bids*lamb).sum())
+    xmax = max(asks.max(), (asks*lamb).sum())
+    widths = lamb * (asks - bids)
+    shift = (lamb * bids).sum()
+    widths = widths[widths > 0] # point masses only shift the sum
+    if n_points is None: # resolve the narrowest weighted uniform by ~8 points
+        n_points = int(np.clip(8 * (xmax - xmin) / widths.min(), 1001, 100001)) if len(widths) else 1001
+    grid = np.linspace(xmin, xmax, n_points)
+    if len(widths) == 0:
+        pdf = np.zeros(n_points)
+    elif method == 'exact' or (method == 'auto' and len(widths) <= MAX_EXACT and _exact_error(widths) < 1e-6):
+        pdf = _uniform_sum_exact(grid - shift, widths)
+    elif method in ['grid', 'auto']:
+        pdf = _uniform_sum_grid(grid - shift, widths)
+    else:
+        raise ValueError(f"'{method}' is not a valid value for method; supported values are 'auto', 'exact', 'grid'")
+    grid.flags.writeable = False
+    pdf.flags.writeable = False
+    return grid, pdf
 
-    # cut out grid where there is no support for any distribution
-    idx = np.argwhere((xmin<=big_grid)&(big_grid<=xmax))
-    big_grid = big_grid[idx]
-    pmfs = [pm[idx] for pm in pmfs]
-    wpmfs = [pm[idx] for pm in wpmfs]
-    conv_pmf = conv_pmf[idx]
-    pdfs = [pm[idx] for pm in pdfs]
-    wpdfs = [pm[idx] for pm in wpdfs]
-    conv_pdf = conv_pdf[idx]
-    
-    return big_grid, conv_pdf
+def uniform_convolution(markets, weights=None, method='auto', n_points=None):
+    '''
+    Density of the weighted mean sum_i lamb_i X_i of independent uniform markets X_i ~ U(bid_i, ask_i),
+    lamb = weights / sum(weights), on n_points spanning all markets and the mean's support.
+    method: 'exact' piecewise polynomial density, 'grid' convolution on a lattice local to the support,
+    'auto' exact unless its round-off (many or very unequal markets) could exceed 1e-6 or there are more
+    than MAX_EXACT markets with a spread, which 'exact' refuses.
+    Results are cached per (bids, asks, weights), the returned arrays are read-only.
+    '''
+    if weights is None:
+        weights = np.ones(len(markets))
+    lamb = np.asarray(weights, dtype=float) / np.sum(weights)
+    book = markets if isinstance(markets, MarketBook) else MarketBook.from_markets(markets)
+    key = (tuple(book.bid.tolist()), tuple(book.ask.tolist()), tuple(lamb.tolist()))
+    return _convolution(*key, method, n_points)
 
 class Market:
+    __slots__ = ('bid', 'ask', 'theo')
     def __init__(self, bid, ask, theo=None):
         self.bid = float(bid)
         self.ask = float(ask)
-        self.theo = float(theo) if theo is not None else None
+        self.theo = float(theo) if theo is not None else None # theoretical price
     def mid(self):
         return (self.bid + self.ask)/2
-    def theo(self): #theoretical price
-        return self.theo
     def skew(self):
         raise NotImplemented()
         return self.theo-self.mid
@@ -70,10 +120,63 @@ class Market:
         return Market(bid=mean-3**0.5*var**0.5, ask=mean+3**0.5*var**0.5)
 
 class DerivedMarket(Market):
+    __slots__ = ('src_markets', 'src_weights')
     def __init__(self, mean, var, src_markets, src_weights):
         mkt = super().fit_moments(mean, var)
         super().__init__(mkt.bid, mkt.ask)
         self.src_markets = src_markets
         self.src_weights = src_weights
-    def uniform_convolution(self):
-        return uniform_convolution(self.src_markets, self.src_weights)
\ No newline at end of file
+    def uniform_convolution(self, method='auto', n_points=None):
+        return uniform_convolution(self.src_markets, self.src_weights, method, n_points)
+
+class MarketBook:
+    '''
+    Many markets as contiguous bid, ask and theo arrays (theo NaN when unknown), of any shape,
+    e.g. (N,) venues of one snapshot or (T, N) snapshots. Methods are the vectorized Market methods.
+    Indexing down to a single market gives a Market, any other index a MarketBook (a view for slices).
+    '''
+    __slots__ = ('bid', 'ask', 'theo')
+    def __init__(self, bid, ask, theo=None):
+        self.bid = np.ascontiguousarray(bid, dtype=float)
+        self.ask = np.ascontiguousarray(ask, dtype=float)
+        self.theo = np.full(self.bid.shape, np.nan) if theo is None else np.ascontiguousarray(theo, dtype=float)
+        if not (self.bid.shape == self.ask.shape == self.theo.shape):
+            raise ValueError('bid, ask and theo must have the same shape.')
+    @classmethod
+    def from_markets(cls, markets):
+        theo = [np.nan if m.theo is None else m.theo for m in markets]
+        return cls([m.bid for m in markets], [m.ask for m in markets], theo)
+    def __len__(self):
+        return len(self.bid)
+    def __getitem__(self, idx):
+        bid, ask, theo = self.bid[idx], self.ask[idx], self.theo[idx]
+        if np.ndim(bid) == 0:
+            return Market(bid, ask, None if np.isnan(theo) else theo)
+        book = MarketBook.__new__(MarketBook) # skip the copies of __init__, keep the views
+        book.bid, book.ask, book.theo = bid, ask, theo
+        return book
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+    @property
+    def shape(self):
+        return self.bid.shape
+    def mid(self):
+        return (self.bid + self.ask)/2
+    def spread(self):
+        return self.ask - self.bid
+    def mean(self):
+        return self.mid()
+    def var(self):
+        return self.spread()**2/12
+    def uniform_pdf(self, x):
+        ''' Densities of the uniform markets at x, shape x.shape + self.shape. '''
+        x = np.asarray(x, dtype=float)[(...,) + (None,)*self.bid.ndim]
+        return np.where((self.bid <= x) & (x <= self.ask), 1/self.spread(), 0.0)
+    def gaussian_pdf(self, x):
+        ''' Densities of the moment matched gaussians at x, shape x.shape + self.shape. '''
+        x = np.asarray(x, dtype=float)[(...,) + (None,)*self.bid.ndim]
+        return stats.norm.pdf(x, loc=self.mean(), scale=self.var()**0.5)
+    @staticmethod
+    def fit_moments(mean, var):
+        mean, std = np.asarray(mean, dtype=float), np.asarray(var, dtype=float)**0.5
+        return MarketBook(bid=mean-3**0.5*std, ask=mean+3**0.5*std)
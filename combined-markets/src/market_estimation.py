@@ -1,42 +1,123 @@
+import os
+import math
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 from src.market import *
 
+def _quotes(bids, asks):
+    '''
+    (T, N) bid and ask arrays, T snapshots of N markets; a single snapshot may be given as (N,).
+    '''
+    bids, asks = np.atleast_2d(np.asarray(bids, dtype=float)), np.atleast_2d(np.asarray(asks, dtype=float))
+    if bids.shape != asks.shape:
+        raise ValueError('bids and asks must have the same shape.')
+    return bids, asks
+
+def _moments(bids, asks):
+    '''
+    Mean (mid) and variance of the uniform markets, as Market.mean() and Market.var().
+    '''
+    return (bids + asks)/2, (asks - bids)**2/12
+
+def _arrays(markets):
+    if isinstance(markets, MarketBook):
+        return markets.bid, markets.ask
+    bids = np.array([m.bid for m in markets])
+    asks = np.array([m.ask for m in markets])
+    return bids, asks
+
+def _rew(rew, markets):
+    return rew(markets) if callable(rew) else rew
+
+def varw_batch(bids, asks):
+    '''
+    Inverse variance weights, (T, N).
+    '''
+    v = _moments(*_quotes(bids, asks))[1]
+    w = 1/v
+    return w/w.sum(axis=-1, keepdims=True)
+
 def varw(markets):
     '''
     Inverse variance weights
     '''
-    w = np.array([1/m.var() for m in markets])
-    w = w/np.sum(w)
-    return w
+    return varw_batch(*_arrays(markets))[0]
+
+def _abs_distance_sums(obs):
+    '''
+    sum_j |x_i - x_j| for each row of obs (T, N) in O(N log N) per row, from sorted prefix sums:
+    for the k-th smallest x, k * x - (sum of smaller) + (sum of larger) - (N - 1 - k) * x.
+    '''
+    order = np.argsort(obs, axis=-1)
+    x = np.take_along_axis(obs, order, axis=-1)
+    x = x - x[:, :1] # distances are shift invariant, small values keep the prefix sums exact.
+    n = x.shape[-1]
+    k = np.arange(n)
+    below = np.cumsum(x, axis=-1) - x
+    above = x.sum(axis=-1, keepdims=True) - below - x
+    sums = np.empty_like(obs)
+    np.put_along_axis(sums, order, k*x - below + above - (n - 1 - k)*x, axis=-1)
+    return sums
+
+def distance_sums(obs, p=1, chunk_size=2**22):
+    '''
+    sum_j |x_i - x_j|^p for each row of obs (T, N).
+    p=1 uses sorted prefix sums, O(N log N) per row; other p broadcast all pairs, in chunks
+    of about chunk_size pair distances to bound memory.
+    '''
+    obs = np.atleast_2d(np.asarray(obs, dtype=float))
+    if p == 1:
+        return _abs_distance_sums(obs)
+    n = obs.shape[-1]
+    rows = max(1, chunk_size // max(1, n*n))
+    sums = np.empty_like(obs)
+    for i in range(0, len(obs), rows):
+        x = obs[i:i+rows]
+        sums[i:i+rows] = (np.abs(x[:, :, None] - x[:, None, :])**p).sum(axis=-1)
+    return sums
+
+def _dw_batch(obs, p=1):
+    '''
+    Distance weights of each row of obs (T, N), rows with all points same get unit weights.
+    '''
+    w = distance_sums(obs, p)
+    same = w.sum(axis=-1, keepdims=True) == 0 # all points same
+    w = 1 / np.where(same, 1.0, w)
+    return np.where(same, 1.0, w / w.sum(axis=-1, keepdims=True))
 
 def _dw(obs, p=1):
     '''
     Distance weights
     https://encyclopediaofmath.org/wiki/Distance-weighted_mean
     '''
-    w = np.array([np.abs(np.power(obs - x, p)).sum() for x in obs])
-    if sum(w)>0: #all points same
-        w = 1 / w
-        w = w / np.sum(w)
-    else:
-        w = np.ones(len(obs))
-    return w
+    return _dw_batch(np.atleast_2d(np.asarray(obs, dtype=float)), p)[0]
+
+def dw_batch(bids, asks, p=1):
+    '''
+    Distance weights of the means, (T, N).
+    '''
+    return _dw_batch(_moments(*_quotes(bids, asks))[0], p)
 
 def dw(markets):
     '''
     Distance weights
     https://encyclopediaofmath.org/wiki/Distance-weighted_mean
     '''
-    obs = np.array([m.mean() for m in markets])
-    return _dw(obs)
+    return dw_batch(*_arrays(markets))[0]
 
+def dw_varw_batch(bids, asks):
+    '''
+    Distance weighted and variance weighted, combined, (T, N).
+    '''
+    w = dw_batch(bids, asks) * varw_batch(bids, asks)
+    return w / w.sum(axis=-1, keepdims=True)
 
 def dw_varw(markets):
     '''
     Distance weighted and variance weighted, combined.
     '''
-    w = dw(markets) * varw(markets)
-    return w / np.sum(w)
+    return dw_varw_batch(*_arrays(markets))[0]
 
 
 def online_kalman(markets):
@@ -48,127 +129,277 @@ def online_kalman(markets):
         v_curr = w**2 * v_curr + (1-w)**2 * v_new
     
     # implied weights
-    imp_weights = np.array([1/m.var() for m in markets])
-    imp_weights = imp_weights / imp_weights.sum()
+    imp_weights = varw(markets)
     #return Market.fit_moments(mean=m_curr, var=v_curr)
     return DerivedMarket(mean=m_curr, var=v_curr, src_markets=markets, src_weights=imp_weights)
 
-def kalman(markets, rew=None):
-    mus = np.array([m.mean() for m in markets])
-    v = np.array([m.var() for m in markets])
+class OnlineFusion:
+    '''
+    Streaming online_kalman: fused mean and variance of the latest quote of every venue, updated in O(1)
+    per venue update from running sums of precision (1/var) and precision weighted means.
+    halflife: None, or staleness half-life of a venue's precision, in the units of t, a number for all
+    venues or a dict venue -> half-life (None for no decay). Venues sharing a half-life share running sums,
+    so an update is O(1) and a query O(number of distinct half-lives).
+    Without decay the estimate equals online_kalman / kalman of the latest markets.
+    '''
+    MAX_EXPONENT = 300.0 # rebase a decay group's reference time before exp() overflows.
+
+    def __init__(self, halflife=None, recompute_every=100000):
+        self.halflife = halflife
+        self.recompute_every = recompute_every # exact recompute of the running sums against round-off drift.
+        self.venues = {}
+        self._mean, self._prec, self._t, self._c, self._group = [], [], [], [], []
+        self._groups = {} # half-life -> group index
+        self._rate, self._ref, self._sp, self._spm = [], [], [], []
+        self.n_updates = 0
+
+    def _venue(self, venue):
+        i = self.venues.get(venue)
+        if i is None:
+            hl = self.halflife.get(venue) if isinstance(self.halflife, dict) else self.halflife
+            g = self._groups.get(hl)
+            if g is None:
+                g = self._groups[hl] = len(self._rate)
+                self._rate.append(0.0 if hl is None else math.log(2) / hl)
+                self._ref.append(None)
+                self._sp.append(0.0)
+                self._spm.append(0.0)
+            i = self.venues[venue] = len(self._mean)
+            for state, value in [(self._mean, 0.0), (self._prec, 0.0), (self._t, 0.0), (self._c, 0.0), (self._group, g)]:
+                state.append(value)
+        return i
+
+    def update(self, venue, bid, ask, t=0.0):
+        ''' New quote of venue at time t (non-decreasing per decay group). '''
+        if not ask > bid:
+            raise ValueError(f'Quote of {venue} must have ask > bid, got bid={bid}, ask={ask}.')
+        i = self._venue(venue)
+        g = self._group[i]
+        mean, prec = (bid + ask)/2, 12/(ask - bid)**2 # Market.mean(), 1/Market.var()
+        rate = self._rate[g]
+        if self._ref[g] is None or rate * (t - self._ref[g]) > self.MAX_EXPONENT:
+            self._ref[g] = t
+            self._t[i], self._mean[i], self._prec[i] = t, mean, prec
+            self._recompute(g)
+        else:
+            c = prec * math.exp(rate * (t - self._ref[g])) if rate else prec
+            self._sp[g] += c - self._c[i]
+            self._spm[g] += c * mean - self._c[i] * self._mean[i]
+            self._t[i], self._mean[i], self._prec[i], self._c[i] = t, mean, prec, c
+        self.n_updates += 1
+        if self.n_updates % self.recompute_every == 0:
+            for g in range(len(self._rate)):
+                self._recompute(g)
+        return self
+
+    def remove(self, venue):
+        ''' Drop a venue from the estimate, e.g. on disconnect. '''
+        i = self.venues[venue]
+        g = self._group[i]
+        self._sp[g] -= self._c[i]
+        self._spm[g] -= self._c[i] * self._mean[i]
+        self._prec[i] = self._c[i] = 0.0
+
+    def _recompute(self, g):
+        rate, ref = self._rate[g], self._ref[g]
+        sp = spm = 0.0
+        for i in range(len(self._mean)):
+            if self._group[i] == g and self._prec[i] > 0:
+                self._c[i] = self._prec[i] * math.exp(rate * (self._t[i] - ref)) if rate else self._prec[i]
+                sp += self._c[i]
+                spm += self._c[i] * self._mean[i]
+        self._sp[g], self._spm[g] = sp, spm
+
+    def _sums(self, t):
+        sp = spm = 0.0
+        for rate, ref, gsp, gspm in zip(self._rate, self._ref, self._sp, self._spm):
+            if ref is None:
+                continue
+            f = math.exp(-rate * (t - ref)) if rate else 1.0
+            sp += f * gsp
+            spm += f * gspm
+        return sp, spm
+
+    def estimate(self, t=0.0):
+        ''' Fused mean and variance at time t. '''
+        sp, spm = self._sums(t)
+        if not sp > 0:
+            raise ValueError('No venue to fuse, every venue was removed or has not quoted yet.')
+        return spm / sp, 1 / sp
+
+    def weights(self, t=0.0):
+        ''' Current (decayed) precision weights of the venues, in the order of self.venues. '''
+        w = np.array([p * (np.exp(-self._rate[g] * (t - ti)) if self._rate[g] else 1.0)
+                      for p, g, ti in zip(self._prec, self._group, self._t)])
+        return w / w.sum()
+
+    def market(self, t=0.0):
+        ''' Fused DerivedMarket at time t, with the latest markets of the venues still quoting as source. '''
+        mean, var = self.estimate(t)
+        live = [i for i, p in enumerate(self._prec) if p > 0] # removed venues are left out
+        src = [Market.fit_moments(self._mean[i], 1/self._prec[i]) for i in live]
+        return DerivedMarket(mean=mean, var=var, src_markets=src, src_weights=self.weights(t)[live])
+
+def kalman_batch(bids, asks, rew=None):
+    '''
+    Inverse variance weighted mean of each snapshot.
+    rew: relevance weights, (N,) or (T, N), multiplied into the inverse variances.
+    Returns mean (T,), var (T,) and weights (T, N).
+    '''
+    mus, v = _moments(*_quotes(bids, asks))
     w = 1/v
     if rew is not None:
-        if callable(rew):
-            w *= rew(markets)
-        else:
-            w *= rew
-    
-    lamb = w / w.sum()
-    mu_est = (lamb*mus).sum()
-    var_est = (lamb**2*v).sum()
+        w = w * rew
+    lamb = w / w.sum(axis=-1, keepdims=True)
+    mu_est = (lamb*mus).sum(axis=-1)
+    var_est = (lamb**2*v).sum(axis=-1)
+    return mu_est, var_est, lamb
+
+def kalman(markets, rew=None):
+    mu_est, var_est, lamb = kalman_batch(*_arrays(markets), rew=_rew(rew, markets))
     #return Market.fit_moments(mean=mu_est, var=var_est)
-    return DerivedMarket(mean=mu_est, var=var_est, src_markets=markets, src_weights=lamb)
+    return DerivedMarket(mean=mu_est[0], var=var_est[0], src_markets=markets, src_weights=lamb[0])
 
-def rewl(markets, est='mv', rew=None):
+def rewl_batch(bids, asks, est='mv', rew=None):
     '''
-    rew: relevance weight, None for equal weighted (MLE), '1/v' for inverse of variance, array for custom.
-    estimate: 'm' for mean, 'mv' for mean and variance, 'mmv' for mean and variance of mean.
+    Relevance weighted likelihood estimate of each snapshot, see rewl().
+    rew: relevance weights, (N,) or (T, N), None for equal weights.
+    Returns mean (T,), var (T,) and weights (T, N).
     '''
-    
-    mus = np.array([m.mean() for m in markets])
-    v = np.array([m.var() for m in markets])
-    
-    w = np.ones(len(markets))
+    mus, v = _moments(*_quotes(bids, asks))
+    w = np.ones(mus.shape)
     if rew is not None:
-        if callable(rew):
-            w *= rew(markets)
-        else:
-            w *= rew
-        
-    lamb = w / w.sum()
+        w = w * rew
+    lamb = w / w.sum(axis=-1, keepdims=True)
     if est in ['mv', 'mmvar']: # mean, variance
-        mu_est = (lamb*mus).sum()
-        var_est = (lamb*(mus-mu_est)**2).sum()
-        sumlamb2 = np.sum(lamb**2)
+        mu_est = (lamb*mus).sum(axis=-1)
+        var_est = (lamb*(mus-mu_est[:, None])**2).sum(axis=-1)
+        sumlamb2 = np.sum(lamb**2, axis=-1)
         var_est_ub = 1/(1-sumlamb2) * var_est
         mu_est_var = sumlamb2 / (1-sumlamb2)**2 * var_est
         var_use = var_est_ub if est=='mv' else mu_est_var
-        return DerivedMarket(mean=mu_est, var=var_use, src_markets=markets, src_weights=lamb)
+        return mu_est, var_use, lamb
     elif est=='m': # mean
-        mu_est = np.sum(lamb/v*mus) / np.sum(lamb/v)
-        mu_var_est = np.sum(lamb/v*mus) / np.sum(lamb/v)
         imp_weights = lamb/v
-        imp_weights = imp_weights / imp_weights.sum()
-        return DerivedMarket(mean=mu_est, var=mu_var_est, src_markets=markets, src_weights=imp_weights)
+        mu_est = np.sum(imp_weights*mus, axis=-1) / np.sum(imp_weights, axis=-1)
+        mu_var_est = mu_est.copy()
+        imp_weights = imp_weights / imp_weights.sum(axis=-1, keepdims=True)
+        return mu_est, mu_var_est, imp_weights
     else:
         raise ValueError("'{estimate}' is not a valid value for estimate; supported values are 'm', 'mv'")
+
+def rewl(markets, est='mv', rew=None):
+    '''
+    rew: relevance weight, None for equal weighted (MLE), '1/v' for inverse of variance, array for custom.
+    estimate: 'm' for mean, 'mv' for mean and variance, 'mmv' for mean and variance of mean.
+    '''
+    mu_est, var_est, lamb = rewl_batch(*_arrays(markets), est=est, rew=_rew(rew, markets))
+    return DerivedMarket(mean=mu_est[0], var=var_est[0], src_markets=markets, src_weights=lamb[0])
         
         
+def _dwm_batch(obs, p=1, obs_weights=None):
+    '''
+    Distance Weighted Mean of each row of obs (T, N).
+    '''
+    weights = _dw_batch(obs, p)
+    if obs_weights is not None:
+        weights = weights * obs_weights
+    weights = weights / weights.sum(axis=-1, keepdims=True)
+    return (obs*weights).sum(axis=-1)
+
 def _dwm(obs, p=1, obs_weights=None):
     '''
     Distance Weighted Mean
     '''
-    sqrdist = np.array([np.abs(np.power(obs - x, p)).sum() for x in obs])
-    if sum(sqrdist)>0: #all points same
-        weights = 1 / sqrdist
-    else:
-        weights = np.ones(len(obs))
-    if obs_weights is not None:
-        weights *= obs_weights
-    weights = weights / weights.sum()
-    est = (obs*weights).sum()
-    return est
+    return _dwm_batch(np.atleast_2d(np.asarray(obs, dtype=float)), p, obs_weights)[0]
+
+def dwm_batch(bids, asks, p=1, obs_weights=None):
+    '''
+    Distance weighted mean of the mids, (T,).
+    '''
+    return _dwm_batch(_moments(*_quotes(bids, asks))[0], p, obs_weights)
 
 def dwm(markets, p=1, obs_weights=None):
     '''
     Distance weighted mean.
     '''
-    mids = np.array([m.mid() for m in markets])
-    return _dwm(mids, p, obs_weights)
+    return dwm_batch(*_arrays(markets), p, obs_weights)[0]
+
+def half_sample_mode(x):
+    '''
+    Half sample mode of each row of x (R, n), rows sorted ascending.
+    All rows are windowed together: a window of m points shrinks to the m//2 + 1 consecutive points
+    with the smallest range, until 3 or fewer remain.
+    https://stats.stackexchange.com/questions/176112/how-to-find-the-mode-of-a-probability-density-function
+    '''
+    x = np.atleast_2d(x)
+    rows = np.arange(len(x))[:, None]
+    while x.shape[1] > 3:
+        h1 = x.shape[1] // 2
+        idx = np.argmin(x[:, h1:] - x[:, :-h1], axis=1)
+        x = x[rows, idx[:, None] + np.arange(h1 + 1)]
+    if x.shape[1] == 1:
+        return x[:, 0]
+    elif x.shape[1] == 2:
+        return x.mean(axis=1)
+    d1, d2 = x[:, 1] - x[:, 0], x[:, 2] - x[:, 1]
+    return np.where(d1 == d2, x[:, 1], np.where(d1 < d2, (x[:, 0] + x[:, 1])/2, (x[:, 1] + x[:, 2])/2))
 
 def _modest(obs):
     '''
     Estimation of mode.
     https://stats.stackexchange.com/questions/176112/how-to-find-the-mode-of-a-probability-density-function
     '''
-    obs = np.sort(obs)
-    def rec(x):
-        if len(x)==1:
-            return x[0]
-        elif len(x)==2:
-            return np.mean(x)
-        elif len(x)==3:
-            d1 = x[1]-x[0]
-            d2 = x[2]-x[1]
-            return x[1] if d1==d2 else ((x[0]+x[1])/2 if d1<d1 else (x[1]+x[2])/2)
-        else:
-            h1 = int(len(x)/2)
-            idx = np.argmin(x[h1:]-x[0:-h1])
-            return rec(x[idx:idx+h1+1])
-    return rec(obs)
+    return half_sample_mode(np.sort(obs))[0]
+
+def bootstrap_mode(obs, nsim=10000, rng=None):
+    '''
+    Half sample modes of nsim resamples (with replacement) of obs, sorted and reduced as one (nsim, n) array.
+    '''
+    rng = np.random.default_rng(rng)
+    obs = np.asarray(obs, dtype=float)
+    sub = np.sort(obs[rng.integers(0, obs.size, size=(nsim, obs.size))], axis=1)
+    return half_sample_mode(sub)
 
 import warnings
-def modest(markets, dispersion=None):
+def modest(markets, dispersion=None, nsim=10000, seed=None):
     '''
     Estimation of mode.
     https://stats.stackexchange.com/questions/176112/how-to-find-the-mode-of-a-probability-density-function
+    nsim, seed: number of resamples and seed (or np.random.Generator) of dispersion='bootstrap'.
     '''
     warnings.warn('Mode is estimated on the mid point, not theoretical price (known skew not considered for now).')
-    mids = np.array([m.mean() for m in markets])
-    mid_mode_est = _modest(mids)
+    bids, asks = _arrays(markets)
     if dispersion=='bidask':
-        bids = np.array([m.bid for m in markets])
-        asks = np.array([m.ask for m in markets])
         warnings.warn('Note that (mode(bids)+mode(asks))/2 != mode(means)')
-        mkt = Market(bid=_modest(bids), ask=_modest(asks), theo=mid_mode_est)
-        return DerivedMarket(mean=mkt.mean(), var=mkt.var(), src_markets=markets, src_weights=None)
+    mean, var = modest_batch(bids, asks, dispersion, nsim=nsim, seed=seed)
+    return DerivedMarket(mean=mean[0], var=var[0], src_markets=markets, src_weights=None)
+
+def _modest_rows(bids, asks, dispersion, nsim, seeds):
+    mids = _moments(bids, asks)[0]
+    if dispersion=='bidask':
+        mkt_bid, mkt_ask = half_sample_mode(np.sort(bids, axis=1)), half_sample_mode(np.sort(asks, axis=1))
+        return _moments(mkt_bid, mkt_ask)
     elif dispersion=='bootstrap':
-        nsim = 10000
-        ests = np.empty(nsim)
-        for i in range(nsim):
-            sub = np.random.choice(mids, size=mids.size, replace=True, p=None)
-            ests[i] = _modest(sub)
-        mode_var_est = np.var(ests)
-        return DerivedMarket(mean=mid_mode_est, var=mode_var_est, src_markets=markets, src_weights=None)
+        mean = half_sample_mode(np.sort(mids, axis=1))
+        var = np.array([np.var(bootstrap_mode(m, nsim, np.random.default_rng(s))) for m, s in zip(mids, seeds)])
+        return mean, var
     else:
-        raise ValueError("'{dispersion}' is not a valid value for dispersion; supported values are 'bidask', 'bootstrap'")
+        raise ValueError(f"'{dispersion}' is not a valid value for dispersion; supported values are 'bidask', 'bootstrap'")
+
+def modest_batch(bids, asks, dispersion='bootstrap', nsim=10000, seed=None, n_jobs=1):
+    '''
+    Mode estimate of each snapshot of (T, N) bids and asks, see modest(). Returns mean (T,), var (T,).
+    Every snapshot gets its own seed spawned from seed, so results do not depend on n_jobs.
+    n_jobs: number of processes for dispersion='bootstrap', snapshots are split between them.
+    '''
+    bids, asks = _quotes(bids, asks)
+    seeds = np.random.SeedSequence(seed).spawn(len(bids))
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(bids))
+    if n_jobs == 1 or dispersion != 'bootstrap':
+        return _modest_rows(bids, asks, dispersion, nsim, seeds)
+    chunks = np.array_split(np.arange(len(bids)), n_jobs)
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        futures = [pool.submit(_modest_rows, bids[c], asks[c], dispersion, nsim, seeds[c[0]:c[-1] + 1]) for c in chunks]
+        out = [f.result() for f in futures]
+    return np.concatenate([o[0] for o in out]), np.concatenate([o[1] for o in out])
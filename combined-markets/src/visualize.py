@@ -2,15 +2,18 @@ from matplotlib import pyplot as plt
 import numpy as np
 
 from matplotlib.patches import Rectangle
+from src.market import MarketBook
 def plot_markets(markets, ax, colors=None):
     color_iter = iter(colors)
-    xmin, xmax = min(m.bid for m in markets), max(m.ask for m in markets)
+    book = markets if isinstance(markets, MarketBook) else MarketBook.from_markets(markets)
+    xmin, xmax = book.bid.min(), book.ask.max()
     xx = np.linspace(xmin*0.9, xmax*1.1, 1001)
-    for q in markets:
+    spread, pdfs = book.spread(), book.gaussian_pdf(xx)
+    for i in range(len(book)):
         color = next(color_iter)
         #ax[0].vlines(0, 0, 1)
-        ax.add_patch(Rectangle((q.bid, 0), q.spread(), 1/q.spread(), alpha=0.5, color=color))
-        ax.plot(xx, q.gaussian().pdf(xx), color=color)
+        ax.add_patch(Rectangle((book.bid[i], 0), spread[i], 1/spread[i], alpha=0.5, color=color))
+        ax.plot(xx, pdfs[:, i], color=color)
     # === Alternative way of plotting ===
     #xmin, xmax = min(m.bid for m in markets), max(m.ask for m in markets)
     #xx = np.linspace(xmin*0.9, xmax*1.1, 1001)
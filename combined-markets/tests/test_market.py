@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from src.market import Market, uniform_convolution
+
+def test_uniform_convolution_integrates_to_one():
+    rng = np.random.default_rng(0)
+    for n in range(1, 9):
+        bids = rng.uniform(99.0, 100.0, n)
+        asks = bids + rng.uniform(0.1, 1.0, n)
+        markets = [Market(b, a) for b, a in zip(bids, asks)]
+        for method in ['auto', 'exact', 'grid']:
+            grid, pdf = uniform_convolution(markets, rng.uniform(0.5, 2.0, n), method=method)
+            assert abs(np.trapz(pdf, grid) - 1.0) < 0.02, (n, method)
+
+def test_single_spread_with_point_markets():
+    for markets in [[Market(1, 2)], [Market(1, 1), Market(2, 3)]]:
+        for method in ['auto', 'exact', 'grid']:
+            grid, pdf = uniform_convolution(markets, method=method)
+            assert abs(np.trapz(pdf, grid) - 1.0) < 0.02, (markets, method)
+
+def test_exact_cutover_at_max_exact():
+    import src.market as mkt
+    n = mkt.MAX_EXACT
+    markets = [Market(100.0 + 0.01 * i, 101.0 + 0.01 * i) for i in range(n + 1)]
+    grid, exact = uniform_convolution(markets[:n], method='exact')
+    _, auto = uniform_convolution(markets[:n], method='auto')
+    _, lattice = uniform_convolution(markets[:n], method='grid')
+    np.testing.assert_array_equal(auto, exact)
+    np.testing.assert_allclose(exact, lattice, atol=0.01 * exact.max())
+
+    with pytest.raises(ValueError, match='exact density'):
+        uniform_convolution(markets, method='exact')
+    _, auto = uniform_convolution(markets, method='auto')
+    np.testing.assert_array_equal(auto, uniform_convolution(markets, method='grid')[1])
+
+def test_many_markets_use_the_grid():
+    markets = [Market(100.0, 101.0 + 0.001 * i) for i in range(200)]
+    grid, pdf = uniform_convolution(markets)
+    assert abs(np.trapz(pdf, grid) - 1.0) < 0.02
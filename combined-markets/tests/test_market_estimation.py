@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from src.market import Market
+import src.market_estimation as me
+
+def test_online_fusion_market_without_removed_venues():
+    fusion = me.OnlineFusion()
+    quotes = {'a':(99.0, 101.0), 'b':(99.5, 100.5), 'c':(100.0, 103.0)}
+    for venue, (bid, ask) in quotes.items():
+        fusion.update(venue, bid, ask)
+    fusion.remove('b')
+    market = fusion.market()
+    assert len(market.src_markets) == len(market.src_weights) == 2
+
+    ref = me.kalman([Market(*quotes['a']), Market(*quotes['c'])])
+    assert market.mean() == pytest.approx(ref.mean())
+    np.testing.assert_allclose(market.src_weights, ref.src_weights)
+    grid, pdf = market.uniform_convolution()
+    assert np.trapz(pdf, grid) == pytest.approx(1.0, abs=0.02)
+
+def test_online_fusion_without_venues_raises():
+    fusion = me.OnlineFusion()
+    with pytest.raises(ValueError, match='No venue'):
+        fusion.market()
+    fusion.update('a', 99.0, 101.0)
+    fusion.remove('a')
+    with pytest.raises(ValueError, match='No venue'):
+        fusion.market()
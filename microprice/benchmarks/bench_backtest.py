@@ -0,0 +1,25 @@
+'''
+Benchmark backtest.Backtest, forecast errors at several horizons streamed over quote chunks.
+Run from the microprice folder: python -m benchmarks.bench_backtest
+'''
+import time
+
+import src.preprocess as preproc
+import src.markovchain as mchain
+from src.backtest import backtest
+from benchmarks import synthetic
+
+def main(n=2000000, chunksize=250000, horizons=(1, 5, 10, 50, 100), n_imb=10, dt=1, n_spread=3):
+    df = synthetic.quotes(n)
+    T, misc = preproc.discretize(df.iloc[:n//2], n_imb, dt, n_spread)
+    G1, B = mchain.estimate(preproc.mirror(T, misc))[:2]
+    Gstar = mchain.calc_price_adj(G1, B)[0]
+    test = df.iloc[n//2:]
+    t0 = time.perf_counter()
+    bt = backtest((test.iloc[i:i + chunksize] for i in range(0, len(test), chunksize)), Gstar, misc, horizons)
+    t = time.perf_counter() - t0
+    print('{} quotes, {} horizons: {:.3f} s, {:,.0f} quotes/s'.format(len(test), len(horizons), t, len(test) / t))
+    print(bt.summary())
+
+if __name__ == '__main__':
+    main()
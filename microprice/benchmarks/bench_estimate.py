@@ -0,0 +1,32 @@
+'''
+Benchmark markovchain.estimate, integer coded counts vs pivot table.
+Run from the microprice folder: python -m benchmarks.bench_estimate
+'''
+import time
+import numpy as np
+
+import src.preprocess as preproc
+import src.markovchain as mchain
+from benchmarks import synthetic
+
+def _best_of(fn, repeat=3):
+    best = np.inf
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+def main(sizes=(10000, 100000, 1000000), n_imb=10, dt=1, n_spread=3):
+    print('{:>10} {:>12} {:>12} {:>8}'.format('rows', 'pivot [s]', 'counts [s]', 'speedup'))
+    for n in sizes:
+        df, misc = preproc.discretize(synthetic.quotes(n), n_imb, dt, n_spread)
+        df = preproc.mirror(df, misc)
+        t_pivot, ref = _best_of(lambda: mchain.estimate(df, engine='pivot'))
+        t_counts, res = _best_of(lambda: mchain.estimate(df, engine='counts'))
+        np.testing.assert_allclose(res[0].to_numpy(), ref[0].to_numpy(), atol=1e-10) # G1
+        np.testing.assert_allclose(res[1].to_numpy(), ref[1].to_numpy(), atol=1e-10) # B
+        print('{:>10} {:>12.4f} {:>12.4f} {:>8.1f}x'.format(len(df), t_pivot, t_counts, t_pivot / t_counts))
+
+if __name__ == '__main__':
+    main()
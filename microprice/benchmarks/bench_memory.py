@@ -0,0 +1,45 @@
+'''
+Peak memory (tracemalloc) and time of discretize -> mirror -> estimate against the lean
+discretize_lean -> estimate_codes path.
+Run from the microprice folder: python -m benchmarks.bench_memory
+'''
+import time
+import tracemalloc
+import numpy as np
+
+import src.preprocess as preproc
+import src.markovchain as mchain
+from benchmarks import synthetic
+
+def _frames(quotes, n_imb, dt, n_spread):
+    df, misc = preproc.discretize(quotes, n_imb, dt, n_spread)
+    df = preproc.mirror(df, misc)
+    return mchain.estimate(df)
+
+def _lean(quotes, n_imb, dt, n_spread):
+    codes, misc = preproc.discretize_lean(quotes, n_imb, dt, n_spread)
+    return mchain.estimate_codes(codes, misc)
+
+def _profile(fn, *args):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    out = fn(*args)
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak, elapsed, out
+
+def main(sizes=(100000, 1000000), n_imb=10, dt=1, n_spread=3):
+    print('{:>9} {:>9} {:>12} {:>12} {:>10} {:>10}'.format(
+        'rows', 'raw [MB]', 'frames [MB]', 'lean [MB]', 'frames [s]', 'lean [s]'))
+    for n in sizes:
+        quotes = synthetic.quotes(n)[['bid', 'ask', 'bs', 'as', 'time']]
+        raw = quotes.memory_usage(index=True).sum()
+        peak_f, t_f, ref = _profile(_frames, quotes, n_imb, dt, n_spread)
+        peak_l, t_l, res = _profile(_lean, quotes, n_imb, dt, n_spread)
+        np.testing.assert_allclose(res[0].to_numpy(), ref[0].to_numpy(), atol=1e-12)
+        print('{:>9} {:>9.1f} {:>12.1f} {:>12.1f} {:>10.3f} {:>10.3f}'.format(
+            n, raw / 1e6, peak_f / 1e6, peak_l / 1e6, t_f, t_l))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+'''
+Benchmark pricer.MicropricePricer, per quote and batch.
+Run from the microprice folder: python -m benchmarks.bench_pricer
+'''
+import timeit
+import numpy as np
+
+import src.preprocess as preproc
+import src.markovchain as mchain
+from src.pricer import MicropricePricer
+from benchmarks import synthetic
+
+def main(n=100000, n_imb=10, dt=1, n_spread=3):
+    quotes = synthetic.quotes(n)
+    df, misc = preproc.discretize(quotes, n_imb, dt, n_spread)
+    df = preproc.mirror(df, misc)
+    Gstar, _ = mchain.calc_price_adj(*mchain.estimate(df)[:2])
+    pricer = MicropricePricer(Gstar, misc)
+
+    bid, ask, bs, as_ = (quotes[c].to_numpy() for c in ['bid', 'ask', 'bs', 'as'])
+    batch = pricer.price_batch(bid, ask, bs, as_)
+    rows = list(zip(bid.tolist(), ask.tolist(), bs.tolist(), as_.tolist()))
+    single = np.array([pricer.price(*r) for r in rows])
+    np.testing.assert_allclose(single, batch)
+
+    price = pricer.price
+    t = min(timeit.repeat(lambda: [price(*r) for r in rows], number=1, repeat=3))
+    print('price:       {:8.3f} us/quote'.format(1e6 * t / n))
+    t = min(timeit.repeat(lambda: pricer.price_batch(bid, ask, bs, as_), number=1, repeat=3))
+    print('price_batch: {:8.3f} us/quote'.format(1e6 * t / n))
+
+if __name__ == '__main__':
+    main()
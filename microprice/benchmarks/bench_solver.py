@@ -0,0 +1,39 @@
+'''
+Benchmark and accuracy check of the G1/B and Gstar solvers against the explicit inverse / eigendecomposition.
+Run from the microprice folder: python -m benchmarks.bench_solver
+'''
+import time
+import numpy as np
+
+import src.preprocess as preproc
+import src.markovchain as mchain
+from benchmarks import synthetic
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - t0, out
+
+def main(n=1000000, grids=((10, 3), (50, 5), (100, 10), (200, 10))):
+    spread_probs = np.full(10, 0.1)
+    quotes = synthetic.quotes(n, spread_probs=spread_probs)
+    print('{:>7} {:>9} {:>9} {:>9} {:>9} {:>9} {:>10}'.format(
+        'states', 'inv [s]', 'lu [s]', 'sparse[s]', 'eig [s]', 'fund [s]', 'max |err|'))
+    for n_imb, n_spread in grids:
+        df, misc = preproc.discretize(quotes, n_imb, 1, n_spread)
+        df = preproc.mirror(df, misc)
+        Q, R1, R2, K = mchain._chain_from_counts(*mchain.transition_counts(df))
+        t_inv, (G1, B) = _timed(lambda: mchain._absorbing_solution(Q, R1, R2, K, 'inv'))
+        t_lu, (G1_lu, B_lu) = _timed(lambda: mchain._absorbing_solution(Q, R1, R2, K, 'lu'))
+        t_sp, (G1_sp, B_sp) = _timed(lambda: mchain._absorbing_solution(Q, R1, R2, K, 'sparse'))
+        t_eig, (Gstar, Bstar) = _timed(lambda: mchain.calc_price_adj(G1, B, solver='eig'))
+        t_fund, (Gstar_f, Bstar_f) = _timed(lambda: mchain.calc_price_adj(G1, B, solver='fundamental'))
+        err = max(np.abs(G1_lu - G1).max(), np.abs(B_lu - B).to_numpy().max(),
+                  np.abs(G1_sp - G1).max(), np.abs(B_sp - B).to_numpy().max(),
+                  np.abs(Gstar_f - Gstar).max(), np.abs(Bstar_f - Bstar).to_numpy().max())
+        assert err < 1e-8, err
+        print('{:>7} {:>9.4f} {:>9.4f} {:>9.4f} {:>9.4f} {:>9.4f} {:>10.1e}'.format(
+            len(Q), t_inv, t_lu, t_sp, t_eig, t_fund, err))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+'''
+Benchmark a n_imb x dt parameter study, sweep.sweep vs one discretize -> mirror -> estimate per grid point.
+Run from the microprice folder: python -m benchmarks.bench_sweep
+'''
+import time
+import numpy as np
+
+import src.preprocess as preproc
+import src.markovchain as mchain
+from src.sweep import sweep
+from benchmarks import synthetic
+
+def _loop(df, n_imbs, dts, n_spread):
+    gstars = {}
+    for n_imb in n_imbs:
+        for dt in dts:
+            T, misc = preproc.discretize(df, n_imb, dt, n_spread)
+            G1, B = mchain.estimate(preproc.mirror(T, misc))[:2]
+            gstars[(n_imb, dt)] = mchain.calc_price_adj(G1, B)[0]
+    return gstars
+
+def main(sizes=(100000, 1000000), n_imbs=(2, 4, 5, 10), dts=(1, 2, 5, 10), n_spread=3):
+    print('{:>10} {:>8} {:>12} {:>12} {:>8}'.format('rows', 'points', 'loop [s]', 'sweep [s]', 'speedup'))
+    for n in sizes:
+        df = synthetic.quotes(n)
+        t0 = time.perf_counter()
+        ref = _loop(df, n_imbs, dts, n_spread)
+        t1 = time.perf_counter()
+        res = sweep(df, n_imbs, dts, n_spread)['Gstar']
+        t2 = time.perf_counter()
+        for (n_imb, dt), Gstar in ref.items():
+            np.testing.assert_allclose(res.xs((n_imb, dt), level=['n_imb', 'dt']).to_numpy(), Gstar.to_numpy(), atol=1e-10)
+        print('{:>10} {:>8} {:>12.4f} {:>12.4f} {:>8.1f}x'.format(n, len(ref), t1 - t0, t2 - t1, (t1 - t0) / (t2 - t1)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+'''
+Benchmark price_adj_term_structure (one pass) against calc_price_adj(order=k) in a loop.
+Run from the microprice folder: python -m benchmarks.bench_term
+'''
+import time
+import numpy as np
+from numpy.linalg import matrix_power as mpow
+
+import src.preprocess as preproc
+import src.markovchain as mchain
+from benchmarks import synthetic
+
+def _loop(G1, B, orders):
+    # Previous integer order path, sum of matrix powers per order.
+    return np.array([sum(mpow(B, i) for i in range(k)) @ G1 for k in orders])
+
+def main(n=200000, grids=((10, 3), (50, 5)), max_orders=(10, 50, 100)):
+    quotes = synthetic.quotes(n, spread_probs=np.full(5, 0.2))
+    print('{:>7} {:>6} {:>10} {:>10} {:>8}'.format('states', 'K', 'loop [s]', 'pass [s]', 'speedup'))
+    for n_imb, n_spread in grids:
+        df, misc = preproc.discretize(quotes, n_imb, 1, n_spread)
+        G1, B = mchain.estimate(preproc.mirror(df, misc))[:2]
+        for K in max_orders:
+            orders = range(1, K + 1)
+            t0 = time.perf_counter()
+            ref = _loop(G1, B, orders)
+            t1 = time.perf_counter()
+            res = mchain.price_adj_term_structure(G1, B, orders)
+            t2 = time.perf_counter()
+            np.testing.assert_allclose(res.to_numpy(), ref, atol=1e-12)
+            print('{:>7} {:>6} {:>10.4f} {:>10.4f} {:>7.0f}x'.format(len(G1), K, t1-t0, t2-t1, (t1-t0)/(t2-t1)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+'''
+Benchmark suite of the calibration hot paths on synthetic quotes, timings as JSON on stdout.
+Run from the microprice folder: python -m benchmarks.suite [--quick] [--repeat 5]
+Usually run through benchmarks/run.py at the repository root, which stores and compares results.
+'''
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+import src.preprocess as preproc
+import src.markovchain as mchain
+from benchmarks import synthetic
+
+def timeit(fn, repeat):
+    ''' min, median and mean wall time [s] of repeat calls of fn. '''
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return {'min':min(times), 'median':float(np.median(times)), 'mean':float(np.mean(times)), 'repeat':repeat}
+
+def cases(sizes=(100000, 1000000), n_imb=10, dt=1, n_spread=3, ticksize=0.01, spread_probs=(0.7, 0.2, 0.1),
+          orders=(10, 100), seed=0):
+    ''' (name, fn) of every timed call, inputs are prepared outside fn. '''
+    for n in sizes:
+        quotes = synthetic.quotes(n, ticksize=ticksize, spread_probs=spread_probs, seed=seed)
+        T, misc = preproc.discretize(quotes, n_imb, dt, n_spread)
+        M = preproc.mirror(T, misc)
+        G1, B = mchain.estimate(M)[:2]
+        yield f'discretize/n={n}', lambda q=quotes: preproc.discretize(q, n_imb, dt, n_spread)
+        yield f'discretize_lean/n={n}', lambda q=quotes: preproc.discretize_lean(q, n_imb, dt, n_spread)
+        yield f'mirror/n={n}', lambda T=T, misc=misc: preproc.mirror(T, misc)
+        yield f'estimate/n={n}', lambda M=M: mchain.estimate(M)
+        yield f'calc_price_adj/stationary/n={n}', lambda G1=G1, B=B: mchain.calc_price_adj(G1, B)
+        for k in orders:
+            yield f'calc_price_adj/order={k}/n={n}', lambda G1=G1, B=B, k=k: mchain.calc_price_adj(G1, B, order=k)
+
+def run(repeat=5, **kwargs):
+    return {name: timeit(fn, repeat) for name, fn in cases(**kwargs)}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help='small inputs, for smoke tests')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--sizes', type=int, nargs='+', help='numbers of quotes')
+    parser.add_argument('--ticksize', type=float, default=0.01)
+    parser.add_argument('--spread-probs', type=float, nargs='+', default=[0.7, 0.2, 0.1],
+                        help='probabilities of spreads of 1, 2, ... ticks')
+    args = parser.parse_args(argv)
+    sizes = args.sizes or ((10000,) if args.quick else (100000, 1000000))
+    results = run(args.repeat, sizes=sizes, ticksize=args.ticksize, spread_probs=tuple(args.spread_probs))
+    json.dump(results, sys.stdout, indent=1)
+
+if __name__ == '__main__':
+    main()
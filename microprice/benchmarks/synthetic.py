@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+
+def quotes(n=100000, ticksize=0.01, spread_probs=(0.7, 0.2, 0.1), p_move=0.1, price0=100.0, seed=0):
+    '''
+    Synthetic L1 quotes, same columns as iodata.get_df().
+    Spread (in ticks) is drawn from spread_probs, the bid moves with probability p_move,
+    more likely up when the book imbalance is high.
+    '''
+    rng = np.random.default_rng(seed)
+    bs = rng.lognormal(mean=8.0, sigma=1.0, size=n).round()
+    as_ = rng.lognormal(mean=8.0, sigma=1.0, size=n).round()
+    imb = bs / (bs + as_)
+    spread_ticks = rng.choice(np.arange(1, len(spread_probs) + 1), size=n, p=np.asarray(spread_probs) / np.sum(spread_probs))
+
+    # Bid moves one tick, direction skewed by the previous imbalance.
+    move = rng.random(n) < p_move
+    up = rng.random(n) < np.roll(imb, 1)
+    steps = np.where(move, np.where(up, 1, -1), 0)
+    steps[0] = 0
+    bid_ticks = np.round(price0 / ticksize) + np.cumsum(steps)
+
+    df = pd.DataFrame({'bid': bid_ticks * ticksize,
+                       'bs': bs,
+                       'ask': (bid_ticks + spread_ticks) * ticksize,
+                       'as': as_})
+    df.index = pd.date_range('2021-01-01', periods=n, freq='100ms', name='timestamp')
+    df['time'] = df.index
+    df['mid'] = 0.5 * (df['bid'] + df['ask'])
+    df['sprd'] = 0.5 * (df['ask'] - df['bid'])
+    df['imb'] = imb
+    df['wmid'] = df['ask'] * df['imb'] + df['bid'] * (1 - df['imb'])
+    return df
@@ -0,0 +1,84 @@
+import numpy as np
+
+import recorder
+
+QUOTE_FIELDS = ['bidSize', 'bidPrice', 'askSize', 'askPrice']
+
+
+def asof_index(trade_times, quote_times, inclusive=True):
+    '''
+    Index of the prevailing quote of every trade, the last quote at (inclusive) or strictly before the trade time,
+    -1 when there is none. Both time arrays must be sorted.
+    '''
+    return np.searchsorted(quote_times, trade_times, side='right' if inclusive else 'left') - 1
+
+
+def iter_asof(trade_chunks, quote_chunks, inclusive=True):
+    '''
+    As-of join of time ordered trade and quote record chunks, e.g. recorder.iter_ticks() over many days.
+    Yields (trades, quotes) of equal length per trade chunk, quotes[i] the prevailing quote of trades[i]
+    (a record with NaN prices and zero sizes when there is none). Only the quotes spanning the current
+    trade chunk and the prevailing one before it are held in memory.
+    '''
+    quote_chunks = iter(quote_chunks)
+    empty = np.zeros(1, dtype=recorder.SCHEMAS['quotes'])
+    empty['timestamp'] = np.iinfo(np.int64).min
+    empty['bidPrice'] = empty['askPrice'] = np.nan
+    quotes, exhausted = empty, False
+    for trades in trade_chunks:
+        if len(trades) == 0:
+            continue
+        t_last = trades['timestamp'][-1]
+        # quotes at t_last still prevail (inclusive), so read until one is strictly later.
+        while not exhausted and quotes['timestamp'][-1] <= t_last:
+            nxt = next(quote_chunks, None)
+            if nxt is None:
+                exhausted = True
+            elif len(nxt):
+                quotes = np.concatenate([quotes, nxt])
+        idx = asof_index(trades['timestamp'], quotes['timestamp'], inclusive)
+        yield trades, quotes[idx]
+        # keep the prevailing quote of the last trade, and everything after it.
+        quotes = quotes[max(0, idx[-1]):]
+
+
+class ImbalanceHistogram:
+    '''
+    Histograms of the prevailing book imbalance bidSize / (bidSize + askSize) at buy and sell trades.
+    Updated chunk by chunk, and mergeable (addition) across files or processes.
+    Trades without a prevailing quote or with an empty book are counted in missing.
+    '''
+    def __init__(self, bins=50):
+        self.edges = np.linspace(0.0, 1.0, bins + 1) if np.ndim(bins) == 0 else np.asarray(bins, dtype=float)
+        self.counts = {side: np.zeros(len(self.edges) - 1, dtype=np.int64) for side in recorder.SIDES}
+        self.missing = {side: 0 for side in recorder.SIDES}
+
+    def update(self, trades, quotes):
+        ''' Add trades and their prevailing quotes, e.g. from iter_asof(). '''
+        with np.errstate(invalid='ignore', divide='ignore'):
+            imb = quotes['bidSize'] / (quotes['bidSize'] + quotes['askSize'])
+        for side, code in recorder.SIDES.items():
+            x = imb[trades['side'] == code]
+            ok = np.isfinite(x)
+            self.counts[side] += np.histogram(x[ok], self.edges)[0]
+            self.missing[side] += int((~ok).sum())
+        return self
+
+    def merge(self, other):
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError('Can only merge histograms with the same bins.')
+        merged = ImbalanceHistogram(self.edges)
+        for side in merged.counts:
+            merged.counts[side] = self.counts[side] + other.counts[side]
+            merged.missing[side] = self.missing[side] + other.missing[side]
+        return merged
+
+
+def imbalance_at_trades(symbol, directory='.', days=None, bins=50, chunksize=1000000, inclusive=True):
+    ''' ImbalanceHistogram of symbol over the recorded days, streamed with bounded memory. '''
+    hist = ImbalanceHistogram(bins)
+    trades = recorder.iter_ticks(symbol, 'trades', directory, days, chunksize)
+    quotes = recorder.iter_ticks(symbol, 'quotes', directory, days, chunksize)
+    for t, q in iter_asof(trades, quotes, inclusive):
+        hist.update(t, q)
+    return hist
@@ -0,0 +1,197 @@
+import asyncio
+import calendar
+import json
+import time
+from collections import namedtuple
+
+L1Quote = namedtuple('L1Quote', ['venue', 'symbol', 'timestamp', 'bid', 'bs', 'ask', 'as_'])
+L1Quote.__doc__ = ''' Normalized top of book quote, timestamp in int ns since epoch (UTC). '''
+
+POLICIES = ['block', 'drop_oldest', 'drop_new']
+
+
+def _iso_ns(ts):
+    ''' '2021-02-09T13:44:14.717Z' to int ns since epoch. '''
+    seconds = calendar.timegm(time.strptime(ts[:19], '%Y-%m-%dT%H:%M:%S'))
+    return seconds * 10**9 + int(round(float('0' + ts[19:].rstrip('Z')) * 1e9))
+
+
+def normalize_bitmex(msg):
+    ''' BitMEX 'quote' table message to L1Quotes, other messages are ignored. '''
+    if not isinstance(msg, dict) or msg.get('table') != 'quote':
+        return []
+    return [L1Quote('bitmex', d['symbol'], _iso_ns(d['timestamp']),
+                    d['bidPrice'], d['bidSize'], d['askPrice'], d['askSize']) for d in msg['data']]
+
+
+def normalize_bitfinex(symbol):
+    '''
+    Bitfinex ticker channel messages [chan_id, [BID, BID_SIZE, ASK, ASK_SIZE, ...], (mts)] to L1Quotes.
+    The timestamp is the TIMESTAMP flag mts if present, otherwise receive time.
+    '''
+    def normalize(msg):
+        if not isinstance(msg, list) or len(msg) < 2 or not isinstance(msg[1], list):
+            return [] # events, heartbeats
+        bid, bs, ask, as_ = msg[1][:4]
+        ts = int(msg[2]) * 10**6 if len(msg) > 2 else time.time_ns()
+        return [L1Quote('bitfinex', symbol, ts, bid, bs, ask, as_)]
+    return normalize
+
+
+class TcpSource:
+    ''' Newline delimited JSON messages over TCP, e.g. from a ReplayServer. '''
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+
+    async def messages(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                yield json.loads(line)
+        finally:
+            writer.close()
+
+
+class WebsocketSource:
+    ''' JSON messages from a websocket, subscribe messages are sent after connecting. Requires websockets. '''
+    def __init__(self, url, subscribe=()):
+        self.url, self.subscribe = url, list(subscribe)
+
+    async def messages(self):
+        import websockets
+        async with websockets.connect(self.url) as ws:
+            for sub in self.subscribe:
+                await ws.send(json.dumps(sub))
+            async for raw in ws:
+                yield json.loads(raw)
+
+
+class ReplayServer:
+    '''
+    Local stand-in for a venue, sends messages as newline delimited JSON to every client that connects.
+    rate: messages per second, None for as fast as possible.
+    '''
+    def __init__(self, messages, host='127.0.0.1', port=0, rate=None):
+        self.messages = list(messages)
+        self.host, self.port, self.rate = host, port, rate
+        self._server = None
+
+    async def _serve(self, reader, writer):
+        for msg in self.messages:
+            writer.write((json.dumps(msg) + '\n').encode())
+            await writer.drain()
+            if self.rate:
+                await asyncio.sleep(1.0 / self.rate)
+        writer.close()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+
+class FeedHandler:
+    '''
+    Multiplexes sources (venues, symbols) into normalized L1Quotes and fans them out to bounded consumer queues.
+    Per consumer policy when its queue is full: 'block' applies backpressure to all sources,
+    'drop_oldest' discards the oldest queued event, 'drop_new' discards the incoming event.
+    Consumers receive None when all sources are exhausted.
+    Per consumer, delivered counts the events put in its queue and not evicted (consumed or still queued),
+    dropped the events discarded by its policy.
+    '''
+    def __init__(self):
+        self._sources = []
+        self._consumers = {}
+        self._source_stats = {}
+
+    def add_source(self, name, source, normalize):
+        self._sources.append((name, source, normalize))
+        self._source_stats[name] = {'messages': 0, 'events': 0, 'errors': 0}
+
+    def add_consumer(self, name, maxsize=10000, policy='block'):
+        if policy not in POLICIES:
+            raise ValueError("'{}' is not a valid value for policy; supported values are {}".format(policy, POLICIES))
+        queue = asyncio.Queue(maxsize=maxsize)
+        self._consumers[name] = {'queue': queue, 'policy': policy, 'delivered': 0, 'dropped': 0}
+        return queue
+
+    async def _publish(self, event):
+        for c in self._consumers.values():
+            queue = c['queue']
+            if queue.full() and c['policy'] != 'block':
+                c['dropped'] += 1
+                if c['policy'] == 'drop_new':
+                    continue
+                queue.get_nowait()
+                c['delivered'] -= 1 # evicted, counted as dropped instead
+            await queue.put(event)
+            c['delivered'] += 1
+
+    async def _pump(self, name, source, normalize):
+        stats = self._source_stats[name]
+        async for msg in source.messages():
+            stats['messages'] += 1
+            try:
+                events = normalize(msg)
+            except Exception:
+                stats['errors'] += 1
+                continue
+            for event in events:
+                stats['events'] += 1
+                await self._publish(event)
+
+    async def run(self):
+        try:
+            await asyncio.gather(*(self._pump(*s) for s in self._sources))
+        finally:
+            for c in self._consumers.values():
+                await c['queue'].put(None)
+
+    def stats(self):
+        ''' Queue depth and delivered/dropped counters per consumer, message/event/error counters per source. '''
+        consumers = {name: {'depth': c['queue'].qsize(), 'maxsize': c['queue'].maxsize, 'policy': c['policy'],
+                            'delivered': c['delivered'], 'dropped': c['dropped']}
+                     for name, c in self._consumers.items()}
+        return {'consumers': consumers, 'sources': {k: dict(v) for k, v in self._source_stats.items()}}
+
+
+async def write_quotes(queue, recorder):
+    '''
+    Consumer writing quotes to a recorder.TickRecorder, symbols are stored as {venue}-{symbol}.
+    Quotes are buffered on the event loop, flushes run in a worker thread so disk writes never stall the sources.
+    '''
+    pending = None
+    while True:
+        q = await queue.get()
+        if q is None:
+            break
+        due = recorder.buffer('{}-{}'.format(q.venue, q.symbol), 'quotes',
+                              {'timestamp': q.timestamp, 'bidSize': q.bs, 'bidPrice': q.bid, 'askPrice': q.ask, 'askSize': q.as_})
+        if due and (pending is None or pending.done()):
+            if pending is not None:
+                pending.result() # at most one flush runs, raise its write errors before starting the next
+            pending = asyncio.ensure_future(asyncio.to_thread(recorder.flush))
+    if pending is not None:
+        await pending
+    await asyncio.to_thread(recorder.flush)
+
+
+async def price_quotes(queue, pricers, on_price):
+    '''
+    Consumer pricing quotes live. pricers: {(venue, symbol): pricer with price(bid, ask, bs, as_)},
+    e.g. src.pricer.MicropricePricer. on_price(quote, microprice) is called for every priced quote.
+    '''
+    while True:
+        q = await queue.get()
+        if q is None:
+            break
+        pricer = pricers.get((q.venue, q.symbol))
+        if pricer is not None:
+            on_price(q, pricer.price(q.bid, q.ask, q.bs, q.as_))
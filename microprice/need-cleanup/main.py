@@ -9,7 +9,8 @@ from bitmex_websocket.constants import InstrumentChannels
 from threading import Thread
 
 import time
-import pickle
+
+from recorder import TickRecorder
 
 
 def main():
@@ -50,24 +51,21 @@ def main():
 
 class BitmexSubscriber:
 
-    def __init__(self):
+    def __init__(self, recorder=None):
         self.subscriptions = {}
+        self.recorder = recorder if recorder is not None else TickRecorder()
 
         self._message_handlers = {'trade': self._log_trade, 'quote': self._log_quote}
 
-    def ingest_data(self, filename, data_dict):
-        with open(f'{filename}.pickle', 'ab') as f:
-            pickle.dump(data_dict, f, pickle.HIGHEST_PROTOCOL)
-
     def _log_trade(self, msg):
         #print(msg)
         for item in msg['data']:
-            self.ingest_data(f"{item['symbol']}-trades", item)
+            self.recorder.append(item['symbol'], 'trades', item)
 
     def _log_quote(self, msg):
         #print(msg)
         for item in msg['data']:
-            self.ingest_data(f"{item['symbol']}-quotes", item)
+            self.recorder.append(item['symbol'], 'quotes', item)
 
     def on_message(self, msg):
         table = msg['table']
@@ -78,7 +76,7 @@ class BitmexSubscriber:
 
         instrument = Instrument(symbol=symbol, channels=channels)
         instrument.on('action', lambda msg: self.on_message(msg))
-        thread = Thread(target=instrument.run_forever)
+        thread = Thread(target=instrument.run_forever, daemon=True)
         self.subscriptions.update({symbol: {'channels': channels, 'thread': thread}})
         thread.start()
 
@@ -92,8 +90,14 @@ def bitmex_subscribe():
         InstrumentChannels.trade
     ]
 
-    subscriber = BitmexSubscriber()
-    subscriber.subscribe('XBTUSD', channels)
+    recorder = TickRecorder()
+    subscriber = BitmexSubscriber(recorder)
+    try:
+        subscriber.subscribe('XBTUSD', channels)
+        for sub in subscriber.subscriptions.values():
+            sub['thread'].join()
+    finally:
+        recorder.close() # buffered items are written on exit, e.g. Ctrl-C
 
 
 if __name__ == '__main__':
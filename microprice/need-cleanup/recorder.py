@@ -0,0 +1,188 @@
+import os
+import time
+import uuid
+import threading
+from collections import defaultdict
+
+import numpy as np
+import pandas
+
+NS_PER_DAY = 86400 * 10**9
+
+# Fixed record layouts, files are headerless arrays of these records.
+SCHEMAS = {
+    'quotes': np.dtype([('timestamp', '<i8'), ('bidSize', '<f8'), ('bidPrice', '<f8'),
+                        ('askPrice', '<f8'), ('askSize', '<f8')]),
+    'trades': np.dtype([('timestamp', '<i8'), ('side', 'i1'), ('size', '<i8'), ('price', '<f8'),
+                        ('tickDirection', 'i1'), ('trdMatchID', 'S16'), ('grossValue', '<i8'),
+                        ('homeNotional', '<f8'), ('foreignNotional', '<f8')]),
+}
+SIDES = {'Buy': 1, 'Sell': -1}
+TICK_DIRECTIONS = {'PlusTick': 2, 'ZeroPlusTick': 1, 'MinusTick': -2, 'ZeroMinusTick': -1}
+
+
+def _record(channel, item):
+    ''' Message item to a record tuple, timestamp (ISO string or int ns) is converted at flush. '''
+    if channel == 'quotes':
+        return (item['timestamp'], item['bidSize'] or 0, item['bidPrice'] or np.nan,
+                item['askPrice'] or np.nan, item['askSize'] or 0)
+    else:
+        match_id = uuid.UUID(item['trdMatchID']).bytes if item.get('trdMatchID') else b''
+        return (item['timestamp'], SIDES.get(item['side'], 0), item['size'], item['price'],
+                TICK_DIRECTIONS.get(item.get('tickDirection'), 0), match_id, item.get('grossValue') or 0,
+                item.get('homeNotional') or np.nan, item.get('foreignNotional') or np.nan)
+
+
+def _timestamps(stamps):
+    ''' ISO strings (as sent by BitMEX) or int ns since epoch, to int ns. '''
+    if all(isinstance(t, str) for t in stamps):
+        return np.array([t.rstrip('Z') for t in stamps], dtype='datetime64[ns]').view('<i8')
+    return np.array([np.datetime64(t.rstrip('Z'), 'ns').view('<i8') if isinstance(t, str) else t for t in stamps],
+                    dtype='<i8')
+
+
+def _to_array(channel, records):
+    schema = SCHEMAS[channel]
+    stamps = _timestamps([r[0] for r in records])
+    arr = np.array([(0,) + r[1:] for r in records], dtype=schema)
+    arr['timestamp'] = stamps
+    return arr
+
+
+class TickRecorder:
+    '''
+    Append-only binary recorder of BitMEX quote and trade messages.
+    Items are buffered in memory and appended to {symbol}-{channel}-{YYYYMMDD}.bin (one file per UTC day)
+    when batch_size items are buffered, flush_interval seconds have passed, or on flush()/close().
+    A timer thread flushes items left in the buffer for flush_interval seconds, e.g. in quiet periods,
+    close() stops it and writes what is left.
+    '''
+    def __init__(self, directory='.', batch_size=10000, flush_interval=1.0):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffers = defaultdict(list)
+        self._n_buffered = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock() # buffers, held only to add items or swap them out.
+        self._write_lock = threading.Lock() # file writes, keeps flushes in order.
+        os.makedirs(directory, exist_ok=True)
+        self._closed = threading.Event()
+        self._timer = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._timer.start()
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            if self._n_buffered and time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def buffer(self, symbol, channel, item):
+        ''' Buffer an item without writing, returns True when a flush is due. '''
+        with self._lock:
+            self._buffers[(symbol, channel)].append(_record(channel, item))
+            self._n_buffered += 1
+            return self._n_buffered >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval
+
+    def append(self, symbol, channel, item):
+        ''' Buffer an item and flush in the calling thread when due. '''
+        if self.buffer(symbol, channel, item):
+            self.flush()
+
+    def flush(self):
+        ''' Write the buffered items, appends from other threads are not blocked by the writes. '''
+        with self._write_lock:
+            with self._lock:
+                buffers, self._buffers = self._buffers, defaultdict(list)
+                self._n_buffered = 0
+                self._last_flush = time.monotonic()
+            self._write(buffers)
+
+    def _write(self, buffers):
+        for (symbol, channel), records in buffers.items():
+            if not records:
+                continue
+            arr = _to_array(channel, records)
+            days = arr['timestamp'] // NS_PER_DAY
+            for day in np.unique(days):
+                name = '{}-{}-{}.bin'.format(symbol, channel, np.datetime64(int(day), 'D').astype(str).replace('-', ''))
+                with open(os.path.join(self.directory, name), 'ab') as f:
+                    arr[days == day].tofile(f)
+
+    def close(self):
+        self._closed.set()
+        self._timer.join()
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _files(symbol, channel, directory='.', days=None):
+    ''' (path, number of complete records) of the day files of symbol and channel, in day order. '''
+    itemsize = SCHEMAS[channel].itemsize
+    prefix = '{}-{}-'.format(symbol, channel)
+    files = sorted(f for f in os.listdir(directory) if f.startswith(prefix) and f.endswith('.bin'))
+    if days is not None:
+        files = [f for f in files if f[len(prefix):-len('.bin')] in set(days)]
+    paths = [os.path.join(directory, f) for f in files]
+    return [(path, os.path.getsize(path) // itemsize) for path in paths if os.path.getsize(path) >= itemsize]
+
+
+def iter_ticks(symbol, channel, directory='.', days=None, chunksize=1000000):
+    '''
+    Raw records (structured arrays of SCHEMAS[channel]) of symbol and channel in chunks of at most chunksize,
+    file by file in day order, without building frames.
+    '''
+    schema = SCHEMAS[channel]
+    for path, n in _files(symbol, channel, directory, days):
+        for start in range(0, n, chunksize):
+            yield np.fromfile(path, dtype=schema, count=min(chunksize, n - start), offset=start * schema.itemsize)
+
+
+def read_ticks(symbol, channel, directory='.', days=None):
+    '''
+    All records of symbol and channel ('quotes' or 'trades') as a DataFrame indexed by timestamp.
+    days: list of 'YYYYMMDD' to read, None for all files. A partially written last record is ignored.
+    '''
+    schema = SCHEMAS[channel]
+    arrays = [np.fromfile(path, dtype=schema, count=n) for path, n in _files(symbol, channel, directory, days)]
+    arr = np.concatenate(arrays) if arrays else np.empty(0, dtype=schema)
+
+    index = pandas.DatetimeIndex(arr['timestamp'].view('datetime64[ns]'), name='timestamp').tz_localize('UTC')
+    data = {name: arr[name] for name in schema.names if name not in ['timestamp', 'trdMatchID']}
+    df = pandas.DataFrame(data, index=index)
+    if channel == 'trades':
+        df['side'] = pandas.Categorical.from_codes(np.select([arr['side'] == 1, arr['side'] == -1], [0, 1], -1),
+                                                   categories=['Buy', 'Sell'])
+        df['tickDirection'] = pandas.Categorical.from_codes(
+            np.select([arr['tickDirection'] == v for v in TICK_DIRECTIONS.values()], list(range(len(TICK_DIRECTIONS))), -1),
+            categories=list(TICK_DIRECTIONS))
+        df['trdMatchID'] = [str(uuid.UUID(bytes=b.ljust(16, b'\0'))) if b else None for b in arr['trdMatchID']]
+    df['symbol'] = symbol
+    return df
+
+
+def fake_messages(n=1000, symbol='XBTUSD', start='2021-02-09T23:59:00', seed=0):
+    '''
+    Local stand-in for the BitMEX feed, alternating quote and trade messages with 1-5 items each.
+    '''
+    rng = np.random.default_rng(seed)
+    t = np.datetime64(start, 'ms')
+    bid = 45800.0
+    for _ in range(n):
+        items = []
+        for _ in range(rng.integers(1, 6)):
+            t += np.timedelta64(int(rng.integers(1, 200)), 'ms')
+            bid += 0.5 * rng.integers(-1, 2)
+            items.append({'timestamp': str(t) + 'Z', 'symbol': symbol, 'bidSize': int(rng.integers(1, 10**6)),
+                          'bidPrice': bid, 'askPrice': bid + 0.5, 'askSize': int(rng.integers(1, 10**6))})
+        yield {'table': 'quote', 'action': 'insert', 'data': items}
+        side = 'Buy' if rng.random() < 0.5 else 'Sell'
+        yield {'table': 'trade', 'action': 'insert', 'data': [
+            {'timestamp': items[-1]['timestamp'], 'symbol': symbol, 'side': side, 'size': int(rng.integers(1, 10**4)),
+             'price': bid + 0.5 if side == 'Buy' else bid, 'tickDirection': 'ZeroPlusTick',
+             'trdMatchID': str(uuid.UUID(int=int(rng.integers(2**62)))), 'grossValue': 1000,
+             'homeNotional': 0.01, 'foreignNotional': 10}]}
@@ -0,0 +1,145 @@
+'''
+Versioned binary calibration artifact, one file with the calibrations of several instruments.
+
+Layout: MAGIC | uint32 version | uint32 header size | JSON header | arrays, each aligned to ALIGN bytes.
+The header holds per instrument the grid (dt, n_imb, n_spread, ticksize), provenance and the dtype,
+shape and offset of every array. Loading memory maps the file and only reads the header, arrays are
+views into the mapping; numpy and the standard library are the only imports, pandas is imported lazily
+by Calibration.to_pandas(). Files are replaced atomically, readers holding the old mapping keep it
+until they reload (ArtifactReader.refresh()).
+'''
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from src.pricer import MicropricePricer
+
+MAGIC = b'MPCALIB\x00'
+VERSION = 1
+ALIGN = 64
+GRID_KEYS = ['dt', 'n_imb', 'n_spread', 'ticksize']
+
+def calibration(Gstar, Bstar, misc, provenance=None):
+    '''
+    Flat arrays of a calibration: Gstar and Bstar from markovchain.calc_price_adj(), misc from
+    preprocess.discretize(). provenance: JSON serializable dict, e.g. ticker, data range, rows.
+    '''
+    ticksize = float(misc['ticksize'])
+    spread_ticks = np.rint(Gstar.index.get_level_values('spread').to_numpy(float) / ticksize).astype(np.int32)
+    imb_bucket = Gstar.index.get_level_values('imb_bucket').to_numpy().astype(np.int32)
+    table = MicropricePricer(Gstar, misc).table
+    arrays = {'spread_ticks':spread_ticks, 'imb_bucket':imb_bucket,
+              'Gstar':Gstar.to_numpy(float), 'Bstar':np.asarray(Bstar, dtype=float),
+              'imb_bucket_edges':np.asarray(misc['imb_bucket_edges'], dtype=float), 'table':table}
+    grid = {k: misc[k].item() if hasattr(misc[k], 'item') else misc[k] for k in GRID_KEYS}
+    return {'grid':grid, 'provenance':provenance or {}, 'arrays':arrays}
+
+def save(path, calibrations):
+    ''' Write {instrument: calibration()} to path, atomically replacing any existing file. '''
+    header, blobs, offset = {'version':VERSION, 'instruments':{}}, [], 0
+    for name, cal in calibrations.items():
+        entry = {'grid':cal['grid'], 'provenance':cal['provenance'], 'arrays':{}}
+        for key, arr in cal['arrays'].items():
+            arr = np.ascontiguousarray(arr)
+            offset += -offset % ALIGN
+            entry['arrays'][key] = {'dtype':arr.dtype.str, 'shape':list(arr.shape), 'offset':offset}
+            blobs.append((offset, arr))
+            offset += arr.nbytes
+        header['instruments'][name] = entry
+    head = json.dumps(header).encode()
+    start = len(MAGIC) + 8 + len(head)
+    start += -start % ALIGN
+
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=folder, prefix='.calib-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC + np.array([VERSION, len(head)], dtype='<u4').tobytes() + head)
+            for off, arr in blobs:
+                f.seek(start + off)
+                f.write(arr.tobytes())
+            f.truncate(start + offset)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, 0o644) # mkstemp creates the file private to the writer.
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+def update(path, calibrations):
+    ''' Add or replace instruments of the artifact at path (created if missing), other instruments are kept. '''
+    merged = {}
+    if os.path.exists(path):
+        merged = {name: {'grid':c.grid, 'provenance':c.provenance, 'arrays':c.arrays} for name, c in load(path).items()}
+    merged.update(calibrations)
+    save(path, merged)
+
+class Calibration:
+    ''' One instrument of an artifact: grid, provenance, misc dict and memory mapped arrays. '''
+    def __init__(self, name, grid, provenance, arrays):
+        self.name, self.grid, self.provenance, self.arrays = name, grid, provenance, arrays
+        edges = arrays['imb_bucket_edges']
+        self.misc = dict(grid, imb_bucket_edges=edges, imb_bucket_mid=0.5*(edges[:-1] + edges[1:]))
+
+    def pricer(self):
+        return MicropricePricer.from_table(self.arrays['table'], self.misc)
+
+    def to_pandas(self):
+        ''' Gstar Series and Bstar DataFrame as returned by markovchain.calc_price_adj(). '''
+        import pandas as pd
+        a = self.arrays
+        index = pd.MultiIndex.from_arrays([a['spread_ticks'] * self.grid['ticksize'], a['imb_bucket'].astype(float)],
+                                          names=['spread', 'imb_bucket'])
+        Gstar = pd.Series(np.array(a['Gstar']), index=index)
+        Bstar = pd.DataFrame(np.array(a['Bstar']), index=index,
+                             columns=index.set_names(['next_spread', 'next_imb_bucket']))
+        return Gstar, Bstar
+
+def load(path):
+    ''' {instrument: Calibration} of an artifact, arrays are read-only views of a memory mapping. '''
+    buf = np.memmap(path, dtype=np.uint8, mode='r')
+    if bytes(buf[:len(MAGIC)]) != MAGIC:
+        raise ValueError(f'{path} is not a calibration artifact.')
+    version, size = np.frombuffer(buf, dtype='<u4', count=2, offset=len(MAGIC))
+    if version > VERSION:
+        raise ValueError(f'{path} has artifact version {version}, this reader supports up to {VERSION}.')
+    start = len(MAGIC) + 8
+    header = json.loads(bytes(buf[start:start + size]))
+    start += int(size)
+    start += -start % ALIGN
+    out = {}
+    for name, entry in header['instruments'].items():
+        arrays = {}
+        for key, spec in entry['arrays'].items():
+            dtype, shape = np.dtype(spec['dtype']), tuple(spec['shape'])
+            count = int(np.prod(shape))
+            arrays[key] = np.frombuffer(buf, dtype=dtype, count=count, offset=start + spec['offset']).reshape(shape)
+        out[name] = Calibration(name, entry['grid'], entry['provenance'], arrays)
+    return out
+
+class ArtifactReader:
+    '''
+    Artifact of a running pricing process, refresh() picks up a file replaced by save() (hot swap).
+    The previous calibrations stay valid (mapped) until dropped by the caller.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self._stat = None
+        self.calibrations = {}
+        self.refresh()
+
+    def refresh(self):
+        ''' Reload if the file was replaced since the last load, True if it was. '''
+        st = os.stat(self.path)
+        stat = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stat == self._stat:
+            return False
+        self.calibrations = load(self.path)
+        self._stat = stat
+        return True
+
+    def __getitem__(self, instrument):
+        return self.calibrations[instrument]
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+from src.pricer import MicropricePricer
+
+PREDICTORS = ['micro', 'mid', 'wmid']
+STATS = ['n', 'bias', 'rmse', 'mae']
+
+class Backtest:
+    '''
+    Out-of-sample forecast errors of the microprice (mid + Gstar), mid and wmid (iodata._extend_fields)
+    against the realized mid h quotes ahead, for every h in horizons.
+    Quotes are consumed in time ordered chunks and only sums of errors, squared and absolute errors
+    per (horizon, predictor, state) are kept, so memory is bounded and backtests of separate chunks
+    of data can be merged. States are (spread, imb_bucket) of the calibration grid, quotes with a
+    spread outside the grid are in a last catch-all state (priced at mid) reported only in summary().
+    Origins where any forecast or the realized mid is undefined (e.g. empty book) are skipped.
+    '''
+    def __init__(self, Gstar, misc, horizons=(1, 5, 10, 50, 100)):
+        self.pricer = MicropricePricer(Gstar, misc)
+        self.horizons = np.asarray(sorted(set(horizons)), dtype=int)
+        if self.horizons.min() < 1:
+            raise ValueError('horizons must be positive numbers of quotes.')
+        self.n_st = self.pricer.n_spread * self.pricer.n_imb
+        # sums[horizon, predictor, stat (1, e, e^2, |e|), state]
+        self.sums = np.zeros((len(self.horizons), len(PREDICTORS), 4, self.n_st + 1))
+        self._tail = None # last max(horizons) rows of mid, forecasts and states, origins of the next chunk.
+
+    def _rows(self, data):
+        p = self.pricer
+        bid, ask, bs, as_ = (data[c].to_numpy(float) for c in ['bid', 'ask', 'bs', 'as'])
+        mid = 0.5 * (bid + ask)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            imb = bs / (bs + as_)
+        wmid = ask * imb + bid * (1 - imb)
+        s = np.rint((ask - bid) / p.ticksize).astype(np.int64) - 1
+        b = np.clip(np.searchsorted(p.edges, imb, side='left') - 1, 0, p.n_imb - 1)
+        state = np.where((0 <= s) & (s < p.n_spread), s * p.n_imb + b, self.n_st)
+        micro = p.price_batch(bid, ask, bs, as_)
+        return {'mid':mid, 'forecast':np.stack([micro, mid, wmid]), 'state':state}
+
+    def update(self, data):
+        ''' Consume a chunk of quotes with columns bid, ask, bs, as, in time order. '''
+        rows = self._rows(data)
+        n_tail = 0
+        if self._tail is not None:
+            n_tail = len(self._tail['mid'])
+            rows = {k: np.concatenate([self._tail[k], v], axis=-1) for k, v in rows.items()}
+        n = len(rows['mid'])
+        for i, h in enumerate(self.horizons):
+            start = max(0, n_tail - h) # earlier origins were scored with the previous chunk.
+            if n - h <= start:
+                continue
+            err = rows['forecast'][:, start:n - h] - rows['mid'][start + h:]
+            ok = np.isfinite(err).all(axis=0)
+            err, state = err[:, ok], rows['state'][start:n - h][ok]
+            for j in range(len(PREDICTORS)):
+                for k, w in enumerate([None, err[j], err[j]**2, np.abs(err[j])]):
+                    self.sums[i, j, k] += np.bincount(state, weights=w, minlength=self.n_st + 1)
+        keep = min(n, int(self.horizons.max()))
+        self._tail = {k: v[..., n - keep:] for k, v in rows.items()}
+        return self
+
+    def merge(self, other):
+        ''' Backtest with the errors of both, origins whose horizon spans the two data sets are not scored. '''
+        if not np.array_equal(self.horizons, other.horizons) or self.sums.shape != other.sums.shape:
+            raise ValueError('Can only merge backtests with the same horizons and grid.')
+        merged = Backtest.__new__(Backtest)
+        merged.pricer, merged.horizons, merged.n_st = self.pricer, self.horizons, self.n_st
+        merged.sums = self.sums + other.sums
+        merged._tail = None
+        return merged
+
+    @staticmethod
+    def _table(sums, index):
+        n = sums[..., 0, :]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out = np.stack([n, sums[..., 1, :] / n, np.sqrt(sums[..., 2, :] / n), sums[..., 3, :] / n], axis=-1)
+        return pd.DataFrame(out.reshape(-1, len(STATS)), index=index, columns=STATS)
+
+    def stats(self):
+        ''' n, bias (mean forecast - realized), rmse and mae per horizon x predictor x (spread, imb_bucket). '''
+        p = self.pricer
+        spread = np.repeat(np.arange(1, p.n_spread + 1) * p.ticksize, p.n_imb)
+        imb_bucket = np.tile(np.arange(p.n_imb), p.n_spread)
+        index = pd.MultiIndex.from_arrays([
+            np.repeat(self.horizons, len(PREDICTORS) * self.n_st),
+            np.tile(np.repeat(PREDICTORS, self.n_st), len(self.horizons)),
+            np.tile(spread, len(self.horizons) * len(PREDICTORS)),
+            np.tile(imb_bucket, len(self.horizons) * len(PREDICTORS))],
+            names=['horizon', 'predictor', 'spread', 'imb_bucket'])
+        return self._table(self.sums[..., :self.n_st], index)
+
+    def summary(self):
+        ''' n, bias, rmse and mae per horizon x predictor over all states, off-grid spreads included. '''
+        index = pd.MultiIndex.from_product([self.horizons, PREDICTORS], names=['horizon', 'predictor'])
+        return self._table(self.sums.sum(axis=-1, keepdims=True), index)
+
+def backtest(chunks, Gstar, misc, horizons=(1, 5, 10, 50, 100)):
+    ''' Backtest over an iterable of quote chunks, e.g. pd.read_csv(..., chunksize=100000), or a single frame. '''
+    bt = Backtest(Gstar, misc, horizons)
+    for chunk in ([chunks] if isinstance(chunks, pd.DataFrame) else chunks):
+        bt.update(chunk)
+    return bt
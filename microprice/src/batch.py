@@ -0,0 +1,129 @@
+import os
+import time
+import itertools
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+import src.iodata as iodata
+import src.preprocess as preproc
+import src.markovchain as mchain
+import src.profiling as profiling
+
+STAGES = ['load', 'discretize', 'mirror', 'estimate', 'calc_price_adj']
+KEY_NAMES = ['ticker', 'day', 'n_imb', 'dt', 'n_spread']
+
+def load_day(ticker, day=None):
+    '''
+    Quotes of ticker from iodata.get_df(), restricted to one calendar day (in the time zone of the data) if given.
+    The day is sliced from the memory mapped cache, so a task only holds its own day in memory.
+    '''
+    if day is None:
+        return iodata.get_df(ticker)
+    start = pd.Timestamp(day).normalize()
+    return iodata.get_df(ticker, start=start, end=start + pd.Timedelta(days=1))
+
+def calibrate(data, n_imb, dt, n_spread, order='stationary', timings=None, profiler=None):
+    '''
+    discretize -> mirror -> estimate -> calc_price_adj, wall times per stage added to timings.
+    profiler: profiling.Profiler recording every stage, with row counts, n_states and cond(I - Q) of estimate.
+    '''
+    timings = {} if timings is None else timings
+    prof = profiling.DISABLED if profiler is None else profiler
+    t0 = time.perf_counter()
+    with prof.stage('discretize', rows_in=len(data)) as st:
+        df, misc = preproc.discretize(data, n_imb, dt, n_spread)
+        st.note(rows=len(df))
+    t1 = time.perf_counter()
+    with prof.stage('mirror', rows_in=len(df)) as st:
+        df = preproc.mirror(df, misc)
+        st.note(rows=len(df))
+    t2 = time.perf_counter()
+    with prof.stage('estimate', rows_in=len(df)) as st:
+        G1, B, Q = mchain.estimate(df)[:3]
+        if prof.enabled:
+            st.note(n_states=len(Q), cond=np.linalg.cond(np.eye(len(Q)) - Q.to_numpy()))
+    t3 = time.perf_counter()
+    with prof.stage('calc_price_adj', order=order) as st:
+        Gstar, Bstar = mchain.calc_price_adj(G1, B, order=order)
+    t4 = time.perf_counter()
+    timings.update({'discretize':t1-t0, 'mirror':t2-t1, 'estimate':t3-t2, 'calc_price_adj':t4-t3})
+    return Gstar, Bstar, misc
+
+def profile(ticker, n_imb, dt, n_spread, day=None, loader=load_day, order='stationary', memory=True, sink=None):
+    ''' load -> calibrate of one ticker and day under a profiling.Profiler, returns the profiler (see summary()). '''
+    prof = profiling.Profiler(memory=memory, sink=sink)
+    with prof.stage('load', ticker=ticker, day=day) as st:
+        data = loader(ticker, day)
+        st.note(rows=len(data))
+    calibrate(data, n_imb, dt, n_spread, order=order, profiler=prof)
+    return prof
+
+def _run_task(ticker, day, params, loader, order):
+    ''' One ticker and day, loaded once and calibrated for every parameter set. '''
+    results = []
+    try:
+        t0 = time.perf_counter()
+        data = loader(ticker, day)
+        t_load = time.perf_counter() - t0
+    except Exception:
+        return [((ticker, day) + tuple(p), None, None, traceback.format_exc()) for p in params]
+    for p in params:
+        key = (ticker, day) + tuple(p)
+        timings = {'load':t_load, 'rows':len(data)}
+        try:
+            Gstar = calibrate(data, *p, order=order, timings=timings)[0]
+            results.append((key, Gstar, timings, None))
+        except Exception:
+            results.append((key, None, timings, traceback.format_exc()))
+    return results
+
+def n_workers(max_workers=None, memory_budget=None, job_memory=2**31):
+    ''' Number of worker processes, bounded by cpu count and memory_budget / job_memory [bytes]. '''
+    workers = max_workers or os.cpu_count() or 1
+    if memory_budget is not None:
+        workers = min(workers, max(1, int(memory_budget // job_memory)))
+    return workers
+
+def run(tickers, days, params, loader=load_day, order='stationary',
+        max_workers=None, memory_budget=None, job_memory=2**31):
+    '''
+    Calibrate every ticker x day x (n_imb, dt, n_spread) in params over a process pool.
+    days: list of days, or [None] for the whole data set. loader(ticker, day) must be picklable.
+    Returns {'Gstar': Series indexed by KEY_NAMES + (spread, imb_bucket),
+             'timings': DataFrame of seconds per stage indexed by KEY_NAMES (load is shared per ticker and day),
+             'errors': {key: traceback}}.
+    '''
+    params = [tuple(p) for p in params]
+    tasks = list(itertools.product(tickers, days))
+    workers = min(n_workers(max_workers, memory_budget, job_memory), len(tasks))
+    gstars, timings, errors = {}, {}, {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_run_task, ticker, day, params, loader, order) for ticker, day in tasks]
+        for fut in as_completed(futures):
+            for key, Gstar, timing, err in fut.result():
+                if Gstar is not None:
+                    gstars[key] = Gstar
+                if timing is not None:
+                    timings[key] = timing
+                if err is not None:
+                    errors[key] = err
+    return {'Gstar':_result_store(gstars),
+            'timings':_timing_table(timings),
+            'errors':errors}
+
+def _result_store(gstars):
+    if not gstars:
+        return pd.Series(dtype=float, name='Gstar')
+    keys = sorted(gstars, key=str)
+    index = pd.MultiIndex.from_tuples([k + st for k in keys for st in gstars[k].index],
+                                      names=KEY_NAMES + ['spread', 'imb_bucket'])
+    return pd.Series(np.concatenate([gstars[k].to_numpy() for k in keys]), index=index, name='Gstar')
+
+def _timing_table(timings):
+    index = pd.MultiIndex.from_tuples(list(timings), names=KEY_NAMES)
+    table = pd.DataFrame(list(timings.values()), index=index).reindex(columns=STAGES + ['rows'])
+    table['total'] = table[STAGES].sum(axis=1)
+    return table.sort_index()
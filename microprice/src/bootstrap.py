@@ -0,0 +1,130 @@
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import src.markovchain as mchain
+
+def resample_counts(counts, nrep, rng):
+    '''
+    Multinomial bootstrap of a count tensor (n_st, n_st, n_dM), each origin state keeps its visit count
+    and redraws its transitions from the estimated transition probabilities. Returns (nrep, n_st, n_st, n_dM).
+    '''
+    n_st = counts.shape[0]
+    flat = counts.reshape(n_st, -1)
+    totals = flat.sum(axis=1)
+    pvals = np.divide(flat, totals[:, None], out=np.full(flat.shape, 1.0 / flat.shape[1]), where=totals[:, None] > 0)
+    return rng.multinomial(totals, pvals, size=(nrep, n_st)).reshape((nrep,) + counts.shape)
+
+def resample_blocks(block_counts, nrep, rng):
+    '''
+    Block bootstrap from per block count tensors (n_blocks, n_st, n_st, n_dM), e.g. one per file or hour,
+    each replicate is the sum of n_blocks blocks drawn with replacement. Returns (nrep, n_st, n_st, n_dM).
+    '''
+    n_blocks = len(block_counts)
+    weights = rng.multinomial(n_blocks, np.full(n_blocks, 1.0 / n_blocks), size=nrep)
+    return np.tensordot(weights, block_counts, axes=1)
+
+def _solve(A, b, ok):
+    '''
+    Batched np.linalg.solve(A, b) of the replicates flagged in ok, NaN for the others.
+    Replicates with a singular A (cond beyond 1/eps) are cleared from ok instead of failing the batch.
+    '''
+    idx = np.flatnonzero(ok)
+    ok[idx[~(np.linalg.cond(A[idx]) < 1.0 / np.finfo(float).eps)]] = False
+    x = np.full(b.shape, np.nan)
+    x[ok] = np.linalg.solve(A[ok], b[ok])
+    return x
+
+def gstar_batch(counts, stspace):
+    '''
+    Stationary Gstar for a batch of count tensors (nrep, n_st, n_st, n_dM), as
+    markovchain.estimate_counts() and calc_price_adj(), with batched linear solves. Returns (nrep, n_st),
+    rows of replicates with a singular system (e.g. a rare state that redrew only dM=0 self-loops) are NaN.
+    '''
+    totals = counts.sum(axis=(-2, -1), keepdims=True)
+    trans = np.divide(counts, totals, out=np.zeros(counts.shape), where=totals > 0)
+    K = stspace['dM']
+    absorb = ~np.isclose(K, 0.0)
+    n_st = counts.shape[-2]
+    eye = np.eye(n_st)
+    ok = np.ones(counts.shape[0], dtype=bool)
+
+    Q = trans[..., ~absorb].sum(axis=-1)
+    R1K = trans[..., absorb].sum(axis=-2) @ K[absorb]
+    R2 = trans[..., absorb].sum(axis=-1)
+    X = _solve(eye - Q, np.concatenate([R1K[..., None], R2], axis=-1), ok)
+    G1, B = X[..., 0], X[..., 1:]
+
+    # Stationary distribution and fundamental matrix, see markovchain._transition_fundamental().
+    A = np.swapaxes(eye - B, -1, -2).copy()
+    A[..., -1, :] = 1.0
+    b = np.zeros(B.shape[:-1] + (1,))
+    b[..., -1, 0] = 1.0
+    pi = _solve(A, b, ok)[..., 0]
+    return _solve(eye - B + pi[..., None, :], G1[..., None], ok)[..., 0]
+
+def _replicates(seed, nrep, counts, block_counts, stspace, mirror, masks, batch_size):
+    rng = np.random.default_rng(seed)
+    out = []
+    for start in range(0, nrep, batch_size):
+        n = min(batch_size, nrep - start)
+        if block_counts is None:
+            C = resample_counts(counts, n, rng)
+        else:
+            C = resample_blocks(block_counts, n, rng)
+        if mirror:
+            C = mchain.mirror_counts(C, stspace)
+        C, st = mchain.trim_counts(C, stspace, masks)
+        out.append(gstar_batch(C, st))
+    return np.concatenate(out)
+
+def bootstrap(counts, stspace, nrep=1000, quantiles=(0.05, 0.5, 0.95), method='multinomial',
+              block_counts=None, mirror=False, seed=None, n_jobs=1, batch_size=None):
+    '''
+    Bootstrap quantiles of Gstar per (spread, imb_bucket) state.
+    counts: count tensor over stspace, e.g. markovchain.transition_counts(T), or the unmirrored
+            StreamingEstimator.counts over its full grid with mirror=True.
+    method: 'multinomial' resamples the transitions of each state, 'block' resamples whole blocks of
+            block_counts (n_blocks, n_st, n_st, n_dM), whose sum is counts.
+    n_jobs: number of processes, replicates are split between them with independent seeds.
+    Returns (DataFrame of the point estimate and quantiles per state, replicates array (nrep, n_states)),
+    replicates with a singular system are NaN rows of the array and left out of the quantiles (with a warning).
+    '''
+    if method == 'block':
+        if block_counts is None:
+            raise ValueError("method='block' requires block_counts.")
+        block_counts = np.asarray(block_counts)
+        counts = block_counts.sum(axis=0)
+    elif method == 'multinomial':
+        block_counts = None
+    else:
+        raise ValueError("'{}' is not a valid value for method; supported values are 'multinomial', 'block'".format(method))
+
+    point = mchain.mirror_counts(counts, stspace) if mirror else counts
+    masks = mchain.visited_states(point, stspace)
+    point, st = mchain.trim_counts(point, stspace, masks)
+    G1, B = mchain.estimate_counts(point, st)[:2]
+    Gstar = mchain.calc_price_adj(G1, B)[0]
+
+    if batch_size is None: # ~100MB of float64 count tensors per batch
+        batch_size = max(1, int(100e6 / (8 * counts.size)))
+    n_jobs = min(n_jobs or os.cpu_count() or 1, nrep)
+    seeds = np.random.SeedSequence(seed).spawn(n_jobs)
+    sizes = [nrep // n_jobs + (i < nrep % n_jobs) for i in range(n_jobs)]
+    args = (counts, block_counts, stspace, mirror, masks, batch_size)
+    if n_jobs == 1:
+        samples = _replicates(seeds[0], nrep, *args)
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            futures = [pool.submit(_replicates, s, n, *args) for s, n in zip(seeds, sizes)]
+            samples = np.concatenate([f.result() for f in futures])
+
+    dropped = int(np.isnan(samples).any(axis=1).sum())
+    if dropped:
+        warnings.warn(f'{dropped} of {nrep} bootstrap replicates have a singular system and are left out of the quantiles.')
+    table = pd.DataFrame(np.nanquantile(samples, quantiles, axis=0).T, index=Gstar.index, columns=list(quantiles))
+    table.insert(0, 'Gstar', Gstar)
+    return table, samples
@@ -2,6 +2,12 @@ import pandas as pd
 import numpy as np
 import pickle
 import gzip
+import json
+import os
+import shutil
+import tempfile
+
+CACHE_DIR = os.path.join('data', 'cache')
 
 def _get_raw_df(ticker):
     file1 = 'data\\{}_20110301_20110331.csv'.format(ticker)
@@ -28,21 +34,79 @@ def _get_raw_df_xbt(ticker):
     df['time'] = df.index # expected by Microprice code
     return df
 
-def _get_raw_df_xbt2(ticker):
-    import dateutil
-    src = r"data\\20210403.csv.gz"
-    iter_csv = pd.read_csv(src, iterator=True, chunksize=100000, compression='gzip')
-    df = pd.concat([chunk[chunk['symbol'] == 'XBTUSD'] for chunk in iter_csv])
-    df.drop(inplace=True, columns=['symbol'])
-    df['timestamp'] = df['timestamp'].map(dateutil.parser.isoparse) 
-    df['time'] = df.index # expected by Microprice code
-    #with gzip.open('{}-quotes.gz'.format(ticker), 'rb+') as f_hnd:
-        #df = pickle.load(f_hnd)    
+DUMP_COLUMNS = {'bidSize':'bs', 'bidPrice':'bid', 'askPrice':'ask', 'askSize':'as'}
+
+def _parse_dump_time(values):
+    ''' Vectorized parse of dump timestamps, ISO or BitMEX '2021-04-03D00:00:06.077963000', to UTC. '''
+    values = values.str.replace('D', 'T', n=1, regex=False)
+    return pd.to_datetime(values, format='%Y-%m-%dT%H:%M:%S.%f', utc=True)
 
-    #df['time'] = df.index # expected by Microprice code
-    #return df
+def iter_dump(src, symbols=None, start=None, end=None, chunksize=500000):
+    '''
+    Quote chunks (symbol, timestamp, bid, bs, ask, as) of a venue dump csv, filtered by symbols and
+    the time range [start, end) while reading. The dump is assumed sorted by time, so chunks before start
+    are skipped without parsing their timestamps, and reading stops at the first chunk past end.
+    '''
+    usecols = ['timestamp', 'symbol'] + list(DUMP_COLUMNS)
+    dtype = dict({c: float for c in DUMP_COLUMNS}, symbol='category')
+    reader = pd.read_csv(src, usecols=usecols, dtype=dtype, chunksize=chunksize)
+    lo = _stamp(start, 'UTC') if start is not None else None
+    hi = _stamp(end, 'UTC') if end is not None else None
+    for chunk in reader:
+        if len(chunk) == 0:
+            continue
+        first, last = _parse_dump_time(chunk['timestamp'].iloc[[0, -1]])
+        if lo is not None and last < lo:
+            continue
+        if hi is not None and first >= hi:
+            break
+        if symbols is not None:
+            chunk = chunk.loc[chunk['symbol'].isin(symbols).to_numpy()]
+        ts = _parse_dump_time(chunk['timestamp'])
+        mask = np.ones(len(chunk), dtype=bool)
+        if lo is not None:
+            mask &= (ts >= lo).to_numpy()
+        if hi is not None:
+            mask &= (ts < hi).to_numpy()
+        chunk = chunk.rename(columns=DUMP_COLUMNS).assign(timestamp=ts)
+        yield chunk.loc[mask]
+
+def _dump_frame(chunks):
+    ''' Same format as _get_raw_df_xbt(): bs, bid, ask, as indexed by timestamp, plus time. '''
+    df = pd.concat(chunks) if chunks else pd.DataFrame(columns=['timestamp'] + list(DUMP_COLUMNS.values()))
+    df = df.set_index(pd.DatetimeIndex(df['timestamp'], name='timestamp'))[list(DUMP_COLUMNS.values())]
+    df['time'] = df.index # expected by Microprice code
     return df
 
+def read_dump(src, symbols, start=None, end=None, chunksize=500000):
+    ''' {symbol: quotes} of a venue dump, see iter_dump(). '''
+    parts = {s: [] for s in symbols}
+    for chunk in iter_dump(src, symbols, start, end, chunksize):
+        for symbol, grp in chunk.groupby('symbol', observed=True, sort=False):
+            parts[symbol].append(grp)
+    return {s: _dump_frame(p) for s, p in parts.items()}
+
+def split_dump(src, symbols=None, cache_dir=CACHE_DIR, chunksize=500000):
+    '''
+    Split a venue dump into the columnar cache in a single pass, one entry per symbol named
+    {symbol}-{dump file name}, e.g. get_cached('XBTUSD-20210403'). Returns the written cache names.
+    '''
+    tag = os.path.basename(src).split('.')[0]
+    parts = {}
+    for chunk in iter_dump(src, symbols, chunksize=chunksize):
+        for symbol, grp in chunk.groupby('symbol', observed=True, sort=False):
+            parts.setdefault(symbol, []).append(grp)
+    names = []
+    for symbol, p in parts.items():
+        name = '{}-{}'.format(symbol, tag)
+        write_cache(_dump_frame(p), os.path.join(cache_dir, name))
+        names.append(name)
+    return names
+
+def _get_raw_df_xbt2(ticker, start=None, end=None):
+    src = os.path.join('data', '20210403.csv.gz')
+    return read_dump(src, [ticker], start, end)[ticker]
+
 def _extend_fields(df):
     df['mid'] = 0.5 * (df['bid'] + df['ask'])
     df['sprd'] = 0.5 * (df['ask'] - df['bid'])
@@ -50,8 +114,178 @@ def _extend_fields(df):
     df['wmid']= df['ask'] * df['imb'] + df['bid'] * (1-df['imb'])
     return df
 
-def get_df(ticker):
+def _get_raw(ticker):
     if ticker in ['BAC', 'CVX']:
-        return _get_raw_df(ticker).pipe(_extend_fields)
+        return _get_raw_df(ticker)
     else:
-        return _get_raw_df_xbt(ticker).pipe(_extend_fields)
\ No newline at end of file
+        return _get_raw_df_xbt(ticker)
+
+def _dt_to_ns(values):
+    ''' datetime-like (naive or tz-aware) to int64 ns since epoch (UTC). '''
+    values = pd.DatetimeIndex(values)
+    if values.tz is not None:
+        values = values.tz_convert('UTC').tz_localize(None)
+    return values.asi8
+
+def _ns_to_dt(values, dtype):
+    ''' int64 ns since epoch back to the stored datetime dtype. '''
+    values = pd.DatetimeIndex(values.view('datetime64[ns]'))
+    tz = getattr(pd.api.types.pandas_dtype(dtype), 'tz', None)
+    return values if tz is None else values.tz_localize('UTC').tz_convert(tz)
+
+def write_cache(df, path, overwrite=True):
+    '''
+    Store df as one .npy file per column (datetimes as int64 ns) plus a json schema.
+    The index is stored as the column '__index__'. Written to a private temporary folder and renamed into place,
+    so concurrent writers of the same entry do not interfere. overwrite=False keeps an entry that another
+    writer completed first.
+    '''
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=folder, prefix=os.path.basename(path) + '.tmp-')
+    try:
+        os.chmod(tmp, 0o755) # mkdtemp creates the folder private to the writer.
+        _write_columns(df, tmp)
+        _move_into_place(tmp, path, overwrite)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def _write_columns(df, tmp):
+    columns = {'__index__': df.index}
+    columns.update({c: df[c] for c in df.columns})
+    schema = {'rows': len(df), 'index_name': df.index.name, 'columns': {}}
+    for i, (name, values) in enumerate(columns.items()):
+        dtype = str(values.dtype)
+        if pd.api.types.is_datetime64_any_dtype(values):
+            arr = _dt_to_ns(values)
+        elif pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+            arr = np.asarray(values)
+        else:
+            continue # object columns (e.g. symbol) are not cached.
+        fname = '{}.npy'.format(i)
+        np.save(os.path.join(tmp, fname), np.ascontiguousarray(arr))
+        schema['columns'][name] = {'file': fname, 'dtype': dtype}
+
+    # Time key for range slicing, must be sorted.
+    for name in ['__index__', 'timestamp', 'time']:
+        col = schema['columns'].get(name)
+        if col is not None and col['dtype'].startswith('datetime64'):
+            ns = np.load(os.path.join(tmp, col['file']))
+            schema['time_key'] = name
+            schema['time_sorted'] = bool(np.all(ns[1:] >= ns[:-1]))
+            break
+    with open(os.path.join(tmp, 'schema.json'), 'w') as f:
+        json.dump(schema, f)
+
+def _move_into_place(tmp, path, overwrite):
+    old = tmp + '.old'
+    if overwrite:
+        try:
+            os.replace(path, old) # readers holding files of the old entry keep them.
+        except FileNotFoundError:
+            pass
+    try:
+        os.replace(tmp, path)
+    except OSError:
+        # Lost the race against another writer of the same entry, its complete entry is as good as ours.
+        if not os.path.exists(os.path.join(path, 'schema.json')):
+            raise
+    finally:
+        shutil.rmtree(old, ignore_errors=True)
+
+def read_cache(path, columns=None, start=None, end=None, retries=10):
+    '''
+    Memory mapped column arrays of a cache written by write_cache(), no parsing or copying.
+    columns: subset of columns (the index is '__index__'), None for all.
+    start, end: time range [start, end) on the time key, datetimes are returned as int64 ns.
+    An entry replaced by another writer while reading is read again, so all arrays come from one version.
+    Returns (arrays, schema).
+    '''
+    for attempt in range(retries):
+        try:
+            version = _version(path)
+            out = _read_cache(path, columns, start, end)
+            if _version(path) == version:
+                return out
+        except FileNotFoundError: # moved aside by a writer replacing the entry
+            if attempt == retries - 1:
+                raise
+    raise RuntimeError('{} kept changing while reading it.'.format(path))
+
+def _version(path):
+    st = os.stat(path)
+    return st.st_ino, st.st_mtime_ns
+
+def _read_cache(path, columns, start, end):
+    with open(os.path.join(path, 'schema.json')) as f:
+        schema = json.load(f)
+    names = list(schema['columns']) if columns is None else list(columns)
+    arrays = {}
+    mask = None
+    i0, i1 = 0, schema['rows']
+    if start is not None or end is not None:
+        key = schema['columns'][schema['time_key']]
+        ns = np.load(os.path.join(path, key['file']), mmap_mode='r')
+        tz = getattr(pd.api.types.pandas_dtype(key['dtype']), 'tz', None)
+        lo = _time_ns(start, tz) if start is not None else np.iinfo(np.int64).min
+        hi = _time_ns(end, tz) if end is not None else np.iinfo(np.int64).max
+        if schema['time_sorted']:
+            i0, i1 = np.searchsorted(ns, [lo, hi], side='left')
+        else:
+            mask = (lo <= ns) & (ns < hi)
+    for name in names:
+        arr = np.load(os.path.join(path, schema['columns'][name]['file']), mmap_mode='r')
+        arrays[name] = arr[i0:i1] if mask is None else arr[mask]
+    return arrays, schema
+
+def _stamp(t, tz):
+    ''' Timestamp in the time zone of the data, naive times are taken as local to it. '''
+    t = pd.Timestamp(t)
+    if tz is not None and t.tz is None:
+        t = t.tz_localize(tz)
+    return t
+
+def _time_ns(t, tz):
+    return _dt_to_ns([_stamp(t, tz)])[0]
+
+def _frame_from_cache(arrays, schema):
+    cols = schema['columns']
+    def values(name):
+        dtype = cols[name]['dtype']
+        return _ns_to_dt(arrays[name], dtype) if dtype.startswith('datetime64') else arrays[name]
+    data = {name: values(name) for name in arrays if name != '__index__'}
+    index = values('__index__') if '__index__' in arrays else None
+    df = pd.DataFrame(data, index=index)
+    if index is not None:
+        df.index.name = schema['index_name']
+    return df
+
+def get_cached(ticker, columns=None, start=None, end=None, refresh=False):
+    '''
+    Raw quotes of ticker from the columnar cache, built from the raw source on first use.
+    columns: projection of raw columns, start/end: time range [start, end).
+    '''
+    path = os.path.join(CACHE_DIR, ticker)
+    if refresh or not os.path.exists(os.path.join(path, 'schema.json')):
+        write_cache(_get_raw(ticker), path, overwrite=refresh)
+    if columns is not None:
+        columns = ['__index__'] + [c for c in columns if c != '__index__']
+    return _frame_from_cache(*read_cache(path, columns, start, end))
+
+def get_df(ticker, start=None, end=None, cache=True):
+    ''' Quotes of ticker with derived fields. cache: load via the columnar cache (see get_cached). '''
+    if cache:
+        return get_cached(ticker, start=start, end=end).pipe(_extend_fields)
+    df = _get_raw(ticker)
+    if start is not None or end is not None:
+        df = df.loc[_time_mask(df, start, end)]
+    return df.pipe(_extend_fields)
+
+def _time_mask(df, start, end):
+    ts = pd.DatetimeIndex(df['timestamp'] if 'timestamp' in df else df.index)
+    mask = np.ones(len(df), dtype=bool)
+    if start is not None:
+        mask &= ts >= _stamp(start, ts.tz)
+    if end is not None:
+        mask &= ts < _stamp(end, ts.tz)
+    return mask
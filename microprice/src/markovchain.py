@@ -1,7 +1,10 @@
 import pandas as pd
 import numpy as np
+import scipy.linalg
 from numpy.linalg import matrix_power as mpow
 
+import src.preprocess as preproc
+
 def _full_stspace(T):
     ''' Get all visited unique states. '''
     def value_union(columns):
@@ -19,7 +22,97 @@ def _stspace_pd_index(stspace):
     dM = pd.Index(stspace['dM'], name='dM')
     return {'spr_imb':spr_imb, 'nxt_spr_imb':nxt_spr_imb, 'dM':dM}
 
-def estimate(T):
+def _factorize(*arrays):
+    ''' Sorted unique values and dense integer codes for each array, one shared coding. '''
+    codes, states = pd.factorize(np.concatenate(arrays), sort=True)
+    return states, np.split(codes, np.cumsum([len(a) for a in arrays[:-1]]))
+
+def _state_codes(T):
+    ''' Map visited states to dense integer codes. '''
+    # Column by column, selecting a sub frame would consolidate (copy) the whole frame.
+    cols = {c: T[c].to_numpy(float) for c in ['spread', 'imb_bucket', 'next_spread', 'next_imb_bucket', 'dM']}
+    valid = ~np.any([np.isnan(x) for x in cols.values()], axis=0)
+    if not valid.all():
+        cols = {c: x[valid] for c, x in cols.items()}
+    spread_states, (spread, next_spread) = _factorize(cols['spread'], cols['next_spread'])
+    imb_states, (imb, next_imb) = _factorize(cols['imb_bucket'], cols['next_imb_bucket'])
+    dM_states, (dM,) = _factorize(cols['dM'])
+    n_imb = len(imb_states)
+    codes = {'state': spread * n_imb + imb, 'next_state': next_spread * n_imb + next_imb, 'dM': dM}
+    stspace = {'spread':spread_states, 'imb_bucket':imb_states, 'dM':dM_states}
+    return codes, stspace
+
+def count_codes(state, next_state, dM, n_st, n_dM):
+    ''' Count tensor from integer coded transitions, a single bincount over the flat index. '''
+    flat = (state.astype(np.int64) * n_st + next_state) * n_dM + dM
+    return np.bincount(flat, minlength=n_st * n_st * n_dM).reshape(n_st, n_st, n_dM)
+
+def transition_counts(T):
+    '''
+    Count tensor {spread, imb_bucket} x {next_spread, next_imb_bucket} x {dM}.
+    States are coded once, and counted with a single bincount over the flat index.
+    '''
+    codes, stspace = _state_codes(T)
+    n_st = len(stspace['spread']) * len(stspace['imb_bucket'])
+    counts = count_codes(codes['state'], codes['next_state'], codes['dM'], n_st, len(stspace['dM']))
+    return counts, stspace
+
+def visited_states(counts, stspace):
+    ''' Boolean masks of the spread, imb_bucket and dM states visited in a count tensor over a fixed grid. '''
+    n_spread, n_imb, n_dM = len(stspace['spread']), len(stspace['imb_bucket']), len(stspace['dM'])
+    C = counts.reshape(n_spread, n_imb, n_spread, n_imb, n_dM)
+    spread = (C.sum(axis=(1, 2, 3, 4)) + C.sum(axis=(0, 1, 3, 4))) > 0
+    imb = (C.sum(axis=(0, 2, 3, 4)) + C.sum(axis=(0, 1, 2, 4))) > 0
+    dM = C.sum(axis=(0, 1, 2, 3)) > 0
+    return {'spread':spread, 'imb_bucket':imb, 'dM':dM}
+
+def trim_counts(counts, stspace, masks=None):
+    '''
+    Restrict a count tensor over a fixed grid to the visited states (or to masks from visited_states()).
+    Leading axes of counts, e.g. bootstrap replicates, are kept.
+    '''
+    masks = visited_states(counts.reshape((-1,) + counts.shape[-3:]).sum(axis=0), stspace) if masks is None else masks
+    n_spread, n_imb, n_dM = len(stspace['spread']), len(stspace['imb_bucket']), len(stspace['dM'])
+    lead = counts.shape[:-3]
+    C = counts.reshape(lead + (n_spread, n_imb, n_spread, n_imb, n_dM))
+    for axis, key in zip(range(-5, 0), ['spread', 'imb_bucket', 'spread', 'imb_bucket', 'dM']):
+        C = C.compress(masks[key], axis=axis)
+    n_st = masks['spread'].sum() * masks['imb_bucket'].sum()
+    C = C.reshape(lead + (n_st, n_st, masks['dM'].sum()))
+    return C, {key: stspace[key][masks[key]] for key in ['spread', 'imb_bucket', 'dM']}
+
+def mirror_counts(counts, stspace):
+    '''
+    Add mirrored transitions (imb_bucket reflected, dM -> -dM) to count tensors with leading batch axes,
+    as preprocess.mirror() does for rows. The imb_bucket and dM states must be symmetric.
+    '''
+    imb, dM = stspace['imb_bucket'], stspace['dM']
+    if not (np.allclose(imb + imb[::-1], imb[0] + imb[-1]) and np.allclose(dM, -dM[::-1])):
+        raise ValueError('Can only mirror a symmetric state space.')
+    n_spread, n_imb, n_dM = len(stspace['spread']), len(imb), len(dM)
+    lead = counts.shape[:-3]
+    C = counts.reshape(lead + (n_spread, n_imb, n_spread, n_imb, n_dM))
+    return (C + C[..., :, ::-1, :, ::-1, ::-1]).reshape(counts.shape)
+
+def _chain_from_counts(counts, stspace):
+    ''' Q, R1, R2 and jump sizes K from a transition count tensor. '''
+    st_idx = _stspace_pd_index(stspace)
+
+    # Get mean MLE estimates, unvisited states have all zero rows.
+    totals = counts.sum(axis=(1, 2), keepdims=True)
+    trans = np.divide(counts, totals, out=np.zeros(counts.shape), where=totals > 0)
+
+    # Mask for absorbed transitions (mid price change occurs)
+    K = stspace['dM']
+    absorb = ~np.isclose(K, 0.0)
+
+    Q = pd.DataFrame(trans[:, :, ~absorb].sum(axis=2), index=st_idx['spr_imb'], columns=st_idx['nxt_spr_imb'])
+    R1 = pd.DataFrame(trans[:, :, absorb].sum(axis=1), index=st_idx['spr_imb'], columns=st_idx['dM'][absorb])
+    R2 = pd.DataFrame(trans[:, :, absorb].sum(axis=2), index=st_idx['spr_imb'], columns=st_idx['nxt_spr_imb'])
+    return Q, R1, R2, K[absorb]
+
+def _chain_from_pivot(T):
+    ''' Q, R1, R2 and jump sizes K via a pivot table (reference implementation). '''
     st_idx = _stspace_pd_index(_full_stspace(T))
 
     # === Transition matrix {spread, imb_bucket} → {next_spread, next_imb_bucket, mid_change} ===
@@ -54,11 +147,66 @@ def estimate(T):
     K = st_idx['dM'].to_numpy()
     if not SHOW_K0_STATE:
         K = K[K!=0.0]
-    eye = np.eye(Q.shape[0])
-    G1 = np.linalg.inv(eye - Q) @ R1 @ K # inv() converts DataFrame into ndarray, so pandas index is gone here.
-    G1.index = Q.index # so we set it back.
-    B = np.linalg.inv(eye - Q) @ R2
-    B.index = Q.index
+    return Q, R1, R2, K
+
+def _absorbing_solution(Q, R1, R2, K, solver='lu'):
+    '''
+    G1 and B of the absorbing chain, G1 = (I - Q)^-1 R1 K and B = (I - Q)^-1 R2.
+    solver: 'lu' factorizes I - Q once and solves for both, 'sparse' the same with a sparse LU
+    (for large, sparse Q), 'inv' explicit inverse (reference implementation).
+    '''
+    if solver == 'inv':
+        eye = np.eye(Q.shape[0])
+        G1 = np.linalg.inv(eye - Q) @ R1 @ K # inv() converts DataFrame into ndarray, so pandas index is gone here.
+        G1.index = Q.index # so we set it back.
+        B = np.linalg.inv(eye - Q) @ R2
+        B.index = Q.index
+        return G1, B
+
+    A = np.eye(Q.shape[0]) - Q.to_numpy()
+    rhs = np.column_stack([R1.to_numpy() @ K, R2.to_numpy()])
+    if solver == 'lu':
+        X = scipy.linalg.lu_solve(scipy.linalg.lu_factor(A), rhs)
+    elif solver == 'sparse':
+        from scipy import sparse
+        from scipy.sparse.linalg import splu
+        X = splu(sparse.csc_matrix(A)).solve(rhs)
+    else:
+        raise ValueError("'{}' is not a valid value for solver; supported values are 'lu', 'sparse', 'inv'".format(solver))
+    G1 = pd.Series(X[:, 0], index=Q.index)
+    B = pd.DataFrame(X[:, 1:], index=Q.index, columns=R2.columns)
+    return G1, B
+
+def estimate_counts(counts, stspace, solver='lu'):
+    ''' Same outputs as estimate(), from a count tensor over the state space stspace. '''
+    Q, R1, R2, K = _chain_from_counts(counts, stspace)
+    G1, B = _absorbing_solution(Q, R1, R2, K, solver)
+    return G1, B, Q, Q.copy(), R1, R2, K
+
+def estimate_codes(codes, misc, mirror=True, solver='lu'):
+    '''
+    Same outputs as estimate(preprocess.mirror(T)), from compact transition codes of preprocess.discretize_lean().
+    mirror: add the mirrored transitions to the counts instead of mirroring rows.
+    '''
+    stspace = preproc.grid_stspace(misc)
+    n_st, n_dM = misc['n_spread'] * misc['n_imb'], len(stspace['dM'])
+    counts = count_codes(codes['state'], codes['next_state'], codes['dM'] + n_dM//2, n_st, n_dM)
+    if mirror:
+        counts = mirror_counts(counts, stspace)
+    return estimate_counts(*trim_counts(counts, stspace), solver=solver)
+
+def estimate(T, engine='counts', solver='lu'):
+    '''
+    engine: 'counts' for integer coded bincount accumulation, 'pivot' for the pivot table reference.
+    solver: 'lu', 'sparse' or 'inv', see _absorbing_solution().
+    '''
+    if engine == 'counts':
+        return estimate_counts(*transition_counts(T), solver=solver)
+    elif engine == 'pivot':
+        Q, R1, R2, K = _chain_from_pivot(T)
+    else:
+        raise ValueError("'{}' is not a valid value for engine; supported values are 'counts', 'pivot'".format(engine))
+    G1, B = _absorbing_solution(Q, R1, R2, K, solver)
     Q2 = Q.copy()
     
     return G1, B, Q, Q2, R1, R2, K
@@ -81,14 +229,63 @@ def _transition_asymtotics(G1, B):
     Gstar = pd.Series(data=Gstar, index=G1.index)
     return Gstar, Bstar
 
-def calc_price_adj(G1, B, order='stationary'):
-    ''' Calculate Price Adjustments.'''
+def _stationary_distribution(B):
+    ''' pi with pi B = pi, sum(pi) = 1. One (redundant) balance equation is replaced by the normalization. '''
+    n = B.shape[0]
+    A = (np.eye(n) - B).T
+    A[-1, :] = 1.0
+    b = np.zeros(n)
+    b[-1] = 1.0
+    return np.linalg.solve(A, b)
+
+def _transition_fundamental(G1, B):
+    '''
+    Gstar via the fundamental matrix Z = (I - B + Bstar)^-1, Bstar = 1 pi:
+    sum_1^inf(B^i - Bstar) = Z - I, so Gstar = G1 + (Z - I) G1 = Z G1, one linear solve and no eigendecomposition.
+    '''
+    Bm = B.to_numpy()
+    n = Bm.shape[0]
+    pi = _stationary_distribution(Bm)
+    Bstar = np.outer(np.ones(n), pi)
+    Gstar = np.linalg.solve(np.eye(n) - Bm + Bstar, G1.to_numpy())
+    Gstar = pd.Series(data=Gstar, index=G1.index)
+    Bstar = pd.DataFrame(data=Bstar, index=B.index, columns=B.columns)
+    return Gstar, Bstar
+
+def _term_structure(G1, B, max_order):
+    ''' Gstar_k = sum_0^{k-1}(B^i) G1 for k = 0..max_order, rows of a (max_order + 1, n) array. '''
+    Bm = B.to_numpy() if hasattr(B, 'to_numpy') else np.asarray(B)
+    v = G1.to_numpy() if hasattr(G1, 'to_numpy') else np.asarray(G1)
+    out = np.zeros((max_order + 1, len(v)))
+    for k in range(1, max_order + 1): # running sum of B^i G1, one mat-vec per order.
+        out[k] = out[k-1] + v
+        v = Bm @ v
+    return out
+
+def price_adj_term_structure(G1, B, orders):
+    ''' Price adjustments Gstar_k for all k in orders in one pass, DataFrame indexed by order x state. '''
+    orders = np.asarray(list(orders), dtype=int)
+    if len(orders) == 0 or orders.min() < 0:
+        raise ValueError('orders must be non-negative integers.')
+    out = _term_structure(G1, B, int(orders.max()))
+    return pd.DataFrame(out[orders], index=pd.Index(orders, name='order'), columns=G1.index)
+
+def calc_price_adj(G1, B, order='stationary', solver='fundamental'):
+    '''
+    Calculate Price Adjustments.
+    solver: stationary solution by 'fundamental' matrix or 'eig' decomposition.
+    '''
     if order == 'stationary':
-        return _transition_asymtotics(G1, B)
+        if solver == 'fundamental':
+            return _transition_fundamental(G1, B)
+        elif solver == 'eig':
+            return _transition_asymtotics(G1, B)
+        else:
+            raise ValueError("'{}' is not a valid value for solver; supported values are 'fundamental', 'eig'".format(solver))
     elif isinstance(order, int): # Crude method,.. if num issues, use the eigendecomp for non asymtotic.
         Bstar = pd.DataFrame(data=mpow(B, order), index=B.index, columns=B.columns)
-        Gstar = sum(mpow(B, i) for i in range(order)) @ G1
+        Gstar = _term_structure(G1, B, order)[order]
         Gstar = pd.Series(data=Gstar, index=B.index)
         return Gstar, Bstar
     else:
-        raise ValueError()
\ No newline at end of file
+        raise ValueError()
@@ -61,4 +61,92 @@ def discretize(data, n_imb, dt, n_spread):
     mask = (T['dM'].abs() <= ticksize*1.1)
     T = T.loc[mask]
 
-    return T, misc
\ No newline at end of file
+    return T, misc
+
+N_DM = 5 # dM in {-1, -1/2, 0, 1/2, 1} ticks, larger jumps are dropped as in discretize().
+
+def grid_misc(n_imb, dt, n_spread, ticksize, imb_bucket_edges=None):
+    ''' Fixed discretization grid, same keys as the misc returned by discretize(). '''
+    if imb_bucket_edges is None:
+        imb_bucket_edges = np.linspace(0.0, 1.0, n_imb + 1)
+    bins = np.asarray(imb_bucket_edges, dtype=float)
+    return {'dt':dt, 'n_imb':n_imb, 'n_spread':n_spread, 'ticksize':ticksize,
+            'imb_bucket_edges':bins, 'imb_bucket_mid':0.5*(bins[:-1] + bins[1::])}
+
+def grid_stspace(misc):
+    ''' Spread, imb_bucket and dM values of the full grid, state code = spread code * n_imb + imb_bucket. '''
+    ticksize = misc['ticksize']
+    return {'spread':np.arange(1, misc['n_spread'] + 1) * ticksize,
+            'imb_bucket':np.arange(misc['n_imb'], dtype=float),
+            'dM':(np.arange(N_DM) - N_DM//2) * (0.5 * ticksize)}
+
+def _columns(data):
+    return tuple(data[c].to_numpy(float) for c in ['bid', 'ask', 'bs', 'as'])
+
+def _codes(bid, ask, bs, as_, misc):
+    ticksize = misc['ticksize']
+    spread = np.rint((ask - bid) / ticksize) - 1
+    mask = (0 <= spread) & (spread < misc['n_spread'])
+    bid, ask, bs, as_, spread = bid[mask], ask[mask], bs[mask], as_[mask], spread[mask]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        imb = bs / (bs + as_)
+    # Same bins as pd.cut(include_lowest=True): (e_i, e_i+1], first bin closed, -1 outside.
+    edges = misc['imb_bucket_edges']
+    imb_bucket = np.searchsorted(edges, imb, side='left') - 1
+    imb_bucket[imb == edges[0]] = 0
+    imb_bucket[imb_bucket >= misc['n_imb']] = -1
+    mid = np.rint((bid + ask) / ticksize).astype(np.int64)
+    return {'spread':spread.astype(code_dtype(misc['n_spread'])),
+            'imb_bucket':imb_bucket.astype(code_dtype(misc['n_imb'])), 'mid':mid}
+
+def code_dtype(n):
+    ''' Smallest signed integer dtype of the codes -1 .. n - 1, e.g. int8 for n_spread, int16 for 160 spreads. '''
+    return np.min_scalar_type(-n)
+
+def discretize_codes(data, misc):
+    '''
+    Integer coded states on a fixed grid (see grid_misc), rows with spread outside the grid are dropped.
+    spread: spread in ticks - 1, imb_bucket: imbalance bucket (-1 outside the edges), mid: mid price in half ticks.
+    '''
+    return _codes(*_columns(data), misc)
+
+def transition_codes(codes, misc):
+    '''
+    Compact transitions dt rows ahead from discretize_codes(): state and next_state (spread code * n_imb
+    + imb_bucket, smallest integer dtype of n_spread * n_imb states) and dM (int8, half ticks). Transitions from or to an imbalance
+    outside the edges, or with |dM| > 1 tick, are dropped as in discretize().
+    '''
+    dt = misc['dt']
+    state = codes['spread'].astype(np.int64) * misc['n_imb'] + codes['imb_bucket']
+    state = state.astype(code_dtype(misc['n_spread'] * misc['n_imb']))
+    idx, dM = transition_rows(codes, dt)
+    return {'state':state[idx], 'next_state':state[idx + dt], 'dM':dM}
+
+def transition_rows(codes, dt):
+    ''' Start rows of the transitions kept by transition_codes() and their dM (int8, half ticks). '''
+    valid = codes['imb_bucket'] >= 0
+    dM = codes['mid'][dt:] - codes['mid'][:-dt]
+    idx = np.flatnonzero(valid[:-dt] & valid[dt:] & (np.abs(dM) <= N_DM//2))
+    return idx, dM[idx].astype(np.int8)
+
+def discretize_lean(data, n_imb, dt, n_spread):
+    '''
+    Lean discretize(): same ticksize, buckets and transitions, computed on the bid, ask, bs, as columns only
+    and returned as compact transition codes (see transition_codes), no frame is copied or extended.
+    Mirroring is left to the count accumulation, markovchain.estimate_codes(mirror=True).
+    '''
+    bid, ask, bs, as_ = _columns(data)
+    ticksize, low_edge = data_grid(bid, ask, bs, as_, n_spread)
+    misc = grid_misc(n_imb, dt, n_spread, ticksize, np.linspace(low_edge, 1.0 - low_edge, n_imb + 1))
+    return transition_codes(_codes(bid, ask, bs, as_, misc), misc), misc
+
+def data_grid(bid, ask, bs, as_, n_spread):
+    ''' Ticksize and lowest imbalance edge, derived from the quotes exactly as in discretize(). '''
+    spread = ask - bid
+    ticksize = np.round(spread[spread > 0].min(), 2)
+    ticks = np.rint(spread / ticksize)
+    mask = (0 < ticks) & (ticks <= n_spread)
+    imb = bs[mask] / (bs[mask] + as_[mask])
+    low_edge = np.amin([np.nanmin(imb), 1.0 - np.nanmax(imb)])
+    return ticksize, low_edge
@@ -0,0 +1,75 @@
+import bisect
+import numpy as np
+
+class MicropricePricer:
+    '''
+    Microprice lookup compiled from a calibration, mid + Gstar[spread, imb_bucket].
+    Gstar: Series indexed by (spread, imb_bucket) from markovchain.calc_price_adj(),
+    misc: dict from preprocess.discretize() (imb_bucket_edges, ticksize).
+    Quotes in states without an adjustment (e.g. spread wider than the calibration) are priced at mid.
+    '''
+    def __init__(self, Gstar, misc):
+        ticksize = float(misc['ticksize'])
+        spread_ticks = np.rint(Gstar.index.get_level_values('spread').to_numpy(float) / ticksize).astype(int)
+        imb_bucket = Gstar.index.get_level_values('imb_bucket').to_numpy().astype(int)
+        # table[spread ticks - 1, imb_bucket], NaN-free, missing states have zero adjustment.
+        table = np.zeros((int(spread_ticks.max()), len(misc['imb_bucket_edges']) - 1))
+        table[spread_ticks - 1, imb_bucket] = Gstar.to_numpy(float)
+        self._setup(table, misc)
+
+    @classmethod
+    def from_table(cls, table, misc):
+        ''' Pricer from a dense adjustment table[spread ticks - 1, imb_bucket], e.g. of an artifact.Calibration. '''
+        pricer = cls.__new__(cls)
+        pricer._setup(np.asarray(table, dtype=float), misc)
+        return pricer
+
+    def _setup(self, table, misc):
+        self.ticksize = float(misc['ticksize'])
+        self.edges = np.asarray(misc['imb_bucket_edges'], dtype=float)
+        self.n_imb = len(self.edges) - 1
+        self.n_spread = table.shape[0]
+        self.table = table
+
+        # Hot path state as plain python objects, numpy scalars are slow to index one by one.
+        self._rows = self.table.tolist()
+        self._edges = self.edges.tolist()
+        self._lo = self._edges[0]
+        width = np.diff(self.edges)
+        self._uniform = bool(np.allclose(width, width[0]))
+        self._inv_width = 1.0 / width[0]
+
+    def _bucket(self, imb):
+        # Same bins as pd.cut(include_lowest=True): (e_i, e_i+1], clamped to the outer buckets.
+        if self._uniform:
+            b = int(-((self._lo - imb) * self._inv_width // 1.0)) - 1 # ceil - 1
+            # The division rounds differently from the stored edges, e.g. imb = 0.5 with an even n_imb.
+            if 0 <= b < self.n_imb:
+                if imb <= self._edges[b]:
+                    b -= 1
+                elif imb > self._edges[b + 1]:
+                    b += 1
+        else:
+            b = bisect.bisect_left(self._edges, imb) - 1
+        return 0 if b < 0 else (self.n_imb - 1 if b >= self.n_imb else b)
+
+    def price(self, bid, ask, bs, as_):
+        ''' Microprice of a single quote. '''
+        mid = 0.5 * (bid + ask)
+        s = round((ask - bid) / self.ticksize) - 1 # halves to even, as np.rint in price_batch()
+        if s < 0 or s >= self.n_spread or bs + as_ <= 0:
+            return mid
+        return mid + self._rows[s][self._bucket(bs / (bs + as_))]
+
+    def price_batch(self, bid, ask, bs, as_):
+        ''' Microprice of arrays of quotes. '''
+        bid, ask = np.asarray(bid, dtype=float), np.asarray(ask, dtype=float)
+        bs, as_ = np.asarray(bs, dtype=float), np.asarray(as_, dtype=float)
+        mid = 0.5 * (bid + ask)
+        s = np.rint((ask - bid) / self.ticksize).astype(np.int64) - 1
+        with np.errstate(invalid='ignore', divide='ignore'):
+            imb = bs / (bs + as_)
+        b = np.clip(np.searchsorted(self.edges, imb, side='left') - 1, 0, self.n_imb - 1)
+        valid = (0 <= s) & (s < self.n_spread) & (bs + as_ > 0)
+        adj = np.where(valid, self.table[np.clip(s, 0, self.n_spread - 1), b], 0.0)
+        return mid + adj
@@ -0,0 +1,99 @@
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource # POSIX only
+except ImportError:
+    resource = None
+
+import pandas as pd
+
+class _Stage:
+    def __init__(self, profiler, name, info):
+        self.profiler, self.record = profiler, dict(stage=name, **info)
+
+    def note(self, **info):
+        ''' Attach values to the stage record, e.g. rows out or state-space size. '''
+        self.record.update(info)
+
+    def __enter__(self):
+        if self.profiler.memory:
+            self._started = not tracemalloc.is_tracing() # tracing slows all allocations, stop it again on exit.
+            if self._started:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self._alloc0 = tracemalloc.get_traced_memory()[0]
+        self._cpu0, self._wall0 = time.process_time(), time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall, cpu = time.perf_counter() - self._wall0, time.process_time() - self._cpu0
+        self.record.update(wall=wall, cpu=cpu, rss=_rss(), max_rss=_max_rss())
+        if self.profiler.memory:
+            self.record['peak_alloc'] = tracemalloc.get_traced_memory()[1] - self._alloc0
+            if self._started:
+                tracemalloc.stop()
+        self.profiler._emit(self.record)
+
+class _NullStage:
+    def note(self, **info):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+_NULL_STAGE = _NullStage()
+
+class Profiler:
+    '''
+    Opt-in stage instrumentation: wall and CPU time [s], RSS and peak RSS [bytes] after the stage,
+    and with memory=True the peak of Python/numpy allocations during the stage [bytes] (tracemalloc,
+    which slows allocation heavy code). Values noted on a stage (rows, n_states, ...) are added to its record.
+    Records are kept in self.records and passed to sink(record) if given, e.g. a JSON lines writer.
+    A disabled profiler hands out one shared no-op stage, so instrumented code costs next to nothing.
+    '''
+    def __init__(self, enabled=True, memory=False, sink=None):
+        self.enabled, self.memory, self.sink = enabled, memory, sink
+        self.records = []
+
+    def stage(self, name, **info):
+        return _Stage(self, name, info) if self.enabled else _NULL_STAGE
+
+    def _emit(self, record):
+        self.records.append(record)
+        if self.sink is not None:
+            self.sink(record)
+
+    def summary(self):
+        ''' Records as a DataFrame, one row per stage run, and a total row of wall and cpu. '''
+        table = pd.DataFrame(self.records)
+        if table.empty:
+            return table
+        table = table.set_index('stage')
+        total = table[['wall', 'cpu']].sum().rename('total')
+        return pd.concat([table, total.to_frame().T])
+
+def _rss():
+    ''' Current resident set size [bytes], from /proc where available. '''
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return None
+
+def _max_rss():
+    '''
+    Peak resident set size of the process [bytes], ru_maxrss is in kB on Linux and bytes on macOS.
+    None where getrusage is not available (Windows).
+    '''
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+DISABLED = Profiler(enabled=False)
@@ -0,0 +1,251 @@
+import bisect
+from collections import deque
+
+import numpy as np
+import pandas as pd
+import scipy.linalg
+
+import src.preprocess as preproc
+import src.markovchain as mchain
+import src.bootstrap as bootstrap
+
+N_DM = preproc.N_DM
+
+class StreamingEstimator:
+    '''
+    Incremental Markov chain estimator on a fixed grid (see preprocess.grid_misc).
+    Only the transition count tensor is kept, so quote chunks can be consumed with bounded memory,
+    and estimators fitted on separate files or processes can be merged.
+    '''
+    def __init__(self, misc, mirror=True):
+        self.misc = misc
+        self.mirror = mirror
+        n_st = misc['n_spread'] * misc['n_imb']
+        self.counts = np.zeros((n_st, n_st, N_DM), dtype=np.int64)
+        self._tail = None # last dt coded rows, the start of transitions ending in the next chunk.
+
+    def stspace(self):
+        ''' Full grid state space. '''
+        return preproc.grid_stspace(self.misc)
+
+    def update(self, data):
+        ''' Consume a chunk of quotes with columns bid, ask, bs, as, in time order. '''
+        codes = preproc.discretize_codes(data, self.misc)
+        if self._tail is not None:
+            codes = {k: np.concatenate([self._tail[k], v]) for k, v in codes.items()}
+        trans = preproc.transition_codes(codes, self.misc)
+        self.counts += mchain.count_codes(trans['state'], trans['next_state'], trans['dM'] + N_DM//2,
+                                          len(self.counts), N_DM)
+        self._tail = {k: v[-self.misc['dt']:] for k, v in codes.items()}
+        return self
+
+    def merge(self, other):
+        ''' Estimator with the counts of both, transitions across the two data sets are not counted. '''
+        if not _same_grid(self.misc, other.misc) or self.mirror != other.mirror:
+            raise ValueError('Can only merge estimators on the same grid.')
+        merged = StreamingEstimator(self.misc, self.mirror)
+        merged.counts = self.counts + other.counts
+        return merged
+
+    def transition_counts(self):
+        ''' Count tensor and state space over the visited states, mirrored if enabled. '''
+        counts = mchain.mirror_counts(self.counts, self.stspace()) if self.mirror else self.counts
+        return mchain.trim_counts(counts, self.stspace())
+
+    def estimate(self):
+        ''' G1, B, Q, Q2, R1, R2, K as markovchain.estimate(). '''
+        return mchain.estimate_counts(*self.transition_counts())
+
+    def calc_price_adj(self, order='stationary'):
+        ''' Gstar, Bstar as markovchain.calc_price_adj(). '''
+        G1, B = self.estimate()[:2]
+        return mchain.calc_price_adj(G1, B, order=order)
+
+    def bootstrap(self, nrep=1000, quantiles=(0.05, 0.5, 0.95), seed=None, n_jobs=1):
+        ''' Multinomial bootstrap quantiles of Gstar per state, see bootstrap.bootstrap(). '''
+        return bootstrap.bootstrap(self.counts, self.stspace(), nrep=nrep, quantiles=quantiles,
+                                   mirror=self.mirror, seed=seed, n_jobs=n_jobs)
+
+def _same_grid(misc1, misc2):
+    keys = ['dt', 'n_imb', 'n_spread', 'ticksize']
+    return (all(misc1[k] == misc2[k] for k in keys)
+            and np.array_equal(misc1['imb_bucket_edges'], misc2['imb_bucket_edges']))
+
+def fit(chunks, misc, mirror=True):
+    ''' Fit a StreamingEstimator on an iterable of quote chunks, e.g. pd.read_csv(..., chunksize=100000). '''
+    est = StreamingEstimator(misc, mirror)
+    for chunk in chunks:
+        est.update(chunk)
+    return est
+
+class RollingEstimator:
+    '''
+    Markov chain estimator that tracks intraday drift, on a fixed grid (see preprocess.grid_misc).
+    Transitions are weighted by 0.5**(age / halflife) (age in quote events on the grid), or only the last
+    window transitions are counted; exactly one of halflife, window must be given. Every update is O(1)
+    per quote event. G1, B and Gstar are refreshed every refresh_every events (or on refresh()), the LU
+    factorization of I - Q is reused as long as the visited states do not change and refinement converges.
+    on_refresh(estimator) is called after each refresh, e.g. to rebuild a pricer.MicropricePricer.
+    '''
+    REFINE_TOL = 1e-12 # relative residual accepted from refinement with the previous factorization.
+    REFINE_MAXITER = 8
+
+    def __init__(self, misc, halflife=None, window=None, mirror=True, refresh_every=None,
+                 order='stationary', on_refresh=None):
+        if (halflife is None) == (window is None):
+            raise ValueError('Exactly one of halflife, window must be given.')
+        self.misc = misc
+        self.mirror = mirror
+        self.refresh_every = refresh_every
+        self.order = order
+        self.on_refresh = on_refresh
+        self.n_st = misc['n_spread'] * misc['n_imb']
+        n_flat = self.n_st * self.n_st * N_DM
+        self.halflife, self.window = halflife, window
+        if halflife is not None:
+            self._decay = 0.5 ** (1.0 / halflife)
+            self._scale = 1.0 # counts = _counts * _scale, decay by scaling instead of touching the tensor.
+            self._counts = np.zeros(n_flat)
+        else:
+            self._ring = np.full(window, -1, dtype=np.int64) # flat indices of the last window transitions.
+            self._pos = 0
+            self._counts = np.zeros(n_flat, dtype=np.int64)
+        self._tail = deque(maxlen=misc['dt']) # (state, mid) of the last dt events, state -1 outside the edges.
+        self._edges = np.asarray(misc['imb_bucket_edges'], dtype=float).tolist()
+        self.events = 0
+        self._since_refresh = 0
+        self._lu, self._masks, self._X = None, None, None
+        self.G1 = self.B = self.Gstar = self.Bstar = None
+        self.stats = {'refresh':0, 'factorize':0, 'refine_iter':0}
+
+    def stspace(self):
+        ''' Full grid state space. '''
+        return preproc.grid_stspace(self.misc)
+
+    @property
+    def counts(self):
+        ''' Current (decayed or windowed) count tensor over the full grid. '''
+        counts = self._counts * self._scale if self.halflife is not None else self._counts
+        return counts.reshape(self.n_st, self.n_st, N_DM)
+
+    def _add(self, flat):
+        if self.halflife is not None:
+            self._counts[flat] += 1.0 / self._scale
+        else:
+            old = self._ring[self._pos]
+            if old >= 0:
+                self._counts[old] -= 1
+            self._counts[flat] += 1
+            self._ring[self._pos] = flat
+            self._pos = (self._pos + 1) % self.window
+
+    def push(self, bid, ask, bs, as_):
+        ''' Consume one quote, quotes with a spread outside the grid are skipped as in preprocess.discretize_codes(). '''
+        ticksize, n_imb = self.misc['ticksize'], self.misc['n_imb']
+        s = round((ask - bid) / ticksize) - 1
+        if s < 0 or s >= self.misc['n_spread']:
+            return
+        tot = bs + as_
+        imb = bs / tot if tot > 0 else np.nan
+        b = 0 if imb == self._edges[0] else bisect.bisect_left(self._edges, imb) - 1
+        state = s * n_imb + b if 0 <= b < n_imb else -1
+        mid = round((bid + ask) / ticksize)
+
+        if self.halflife is not None: # every event ages the counts, rescaled only when the scale underflows.
+            self._scale *= self._decay
+            if self._scale < 1e-200:
+                self._counts *= self._scale
+                self._scale = 1.0
+        if len(self._tail) == self._tail.maxlen:
+            state0, mid0 = self._tail[0]
+            dM = mid - mid0
+            if state0 >= 0 and state >= 0 and abs(dM) <= N_DM//2:
+                self._add((state0 * self.n_st + state) * N_DM + dM + N_DM//2)
+        self._tail.append((state, mid))
+        self._tick(1)
+
+    def update(self, data):
+        ''' Consume a chunk of quotes with columns bid, ask, bs, as, in time order, same counts as push() per row. '''
+        codes = preproc.discretize_codes(data, self.misc)
+        n_new = len(codes['mid'])
+        if n_new == 0:
+            return self
+        state = codes['spread'].astype(np.int64) * self.misc['n_imb'] + codes['imb_bucket']
+        state[codes['imb_bucket'] < 0] = -1
+        if self._tail:
+            state = np.concatenate([[st for st, _ in self._tail], state])
+            mid = np.concatenate([[m for _, m in self._tail], codes['mid']])
+        else:
+            mid = codes['mid']
+        dt = self.misc['dt']
+        idx, dM = preproc.transition_rows({'imb_bucket':state, 'mid':mid}, dt)
+        flat = (state[idx] * self.n_st + state[idx + dt]) * N_DM + dM + N_DM//2
+        n_flat = len(self._counts)
+
+        if self.halflife is not None:
+            self._counts *= self._scale * self._decay ** n_new
+            self._scale = 1.0
+            age = len(state) - 1 - (idx + dt) # events after the one that completes the transition.
+            self._counts += np.bincount(flat, weights=self._decay ** age, minlength=n_flat)
+        elif len(flat) >= self.window:
+            self._ring[:] = flat[-self.window:]
+            self._pos = 0
+            self._counts = np.bincount(self._ring, minlength=n_flat)
+        else:
+            slots = (self._pos + np.arange(len(flat))) % self.window
+            old = self._ring[slots]
+            self._counts -= np.bincount(old[old >= 0], minlength=n_flat)
+            self._counts += np.bincount(flat, minlength=n_flat)
+            self._ring[slots] = flat
+            self._pos = (self._pos + len(flat)) % self.window
+        self._tail.extend(zip(state[-dt:].tolist(), mid[-dt:].tolist()))
+        self._tick(n_new)
+        return self
+
+    def _tick(self, n):
+        self.events += n
+        self._since_refresh += n
+        if self.refresh_every is not None and self._since_refresh >= self.refresh_every:
+            self.refresh()
+
+    def transition_counts(self):
+        ''' Count tensor and state space over the visited states, mirrored if enabled. '''
+        counts = mchain.mirror_counts(self.counts, self.stspace()) if self.mirror else self.counts
+        masks = mchain.visited_states(counts, self.stspace())
+        return mchain.trim_counts(counts, self.stspace(), masks) + (masks,)
+
+    def refresh(self):
+        ''' Re-estimate G1, B and Gstar, Bstar (markovchain.calc_price_adj(order)) from the current counts. '''
+        self._since_refresh = 0
+        counts, stspace, masks = self.transition_counts()
+        Q, R1, R2, K = mchain._chain_from_counts(counts, stspace)
+        A = np.eye(Q.shape[0]) - Q.to_numpy()
+        rhs = np.column_stack([R1.to_numpy() @ K, R2.to_numpy()])
+
+        X = None
+        if self._lu is not None and all(np.array_equal(masks[k], self._masks[k]) for k in masks):
+            X = _refine(self._lu, A, rhs, self._X, self.REFINE_TOL, self.REFINE_MAXITER, self.stats)
+        if X is None:
+            self._lu = scipy.linalg.lu_factor(A)
+            self._masks = masks
+            X = scipy.linalg.lu_solve(self._lu, rhs)
+            self.stats['factorize'] += 1
+        self._X = X
+        self.G1 = pd.Series(X[:, 0], index=Q.index)
+        self.B = pd.DataFrame(X[:, 1:], index=Q.index, columns=R2.columns)
+        self.Gstar, self.Bstar = mchain.calc_price_adj(self.G1, self.B, order=self.order)
+        self.stats['refresh'] += 1
+        if self.on_refresh is not None:
+            self.on_refresh(self)
+        return self.Gstar, self.Bstar
+
+def _refine(lu, A, rhs, X, tol, maxiter, stats):
+    ''' Iterative refinement of A X = rhs preconditioned with the LU factors of a nearby matrix, None if it stalls. '''
+    scale = np.abs(rhs).max() or 1.0
+    for _ in range(maxiter):
+        residual = rhs - A @ X
+        if np.abs(residual).max() <= tol * scale:
+            return X
+        X = X + scipy.linalg.lu_solve(lu, residual)
+        stats['refine_iter'] += 1
+    return X if np.abs(rhs - A @ X).max() <= tol * scale else None
@@ -0,0 +1,58 @@
+import math
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+import src.preprocess as preproc
+import src.markovchain as mchain
+
+KEY_NAMES = ['n_imb', 'dt']
+MAX_FINE = np.iinfo(np.int16).max # bounds the fine edges and codes, large LCMs of n_imbs are refused.
+
+def fine_grid(n_imbs):
+    ''' Smallest number of base imbalance buckets that every n_imb in n_imbs divides. '''
+    return reduce(lambda a, b: a * b // math.gcd(a, b), n_imbs, 1)
+
+def sweep(data, n_imbs, dts, n_spread, order='stationary', n_fine=None, mirror=True, solver='lu'):
+    '''
+    Gstar for every n_imb x dt from one discretization of data.
+    Ticksize, spread and mid codes are computed once, on n_fine imbalance buckets (default fine_grid(n_imbs));
+    each n_imb merges n_fine // n_imb neighbouring fine buckets and each dt only takes a lag of the shared codes.
+    The n_imb bucket edges are every (n_fine // n_imb)-th fine edge, equal to discretize()'s up to rounding.
+    n_fine is at most MAX_FINE, sweep n_imbs with a large common multiple in separate calls.
+    Returns {'Gstar': Series indexed by KEY_NAMES + (spread, imb_bucket), 'misc': {(n_imb, dt): misc}}.
+    '''
+    n_imbs, dts = list(n_imbs), list(dts)
+    n_fine = fine_grid(n_imbs) if n_fine is None else n_fine
+    if n_fine > MAX_FINE:
+        raise ValueError(f'n_fine={n_fine} for n_imbs {n_imbs} exceeds {MAX_FINE} buckets, split the sweep into '
+                         'groups of n_imb with a smaller common multiple')
+    if any(n_fine % n_imb for n_imb in n_imbs):
+        raise ValueError(f'n_fine={n_fine} is not a multiple of every n_imb in {n_imbs}')
+
+    bid, ask, bs, as_ = preproc._columns(data)
+    ticksize, low_edge = preproc.data_grid(bid, ask, bs, as_, n_spread)
+    edges = np.linspace(low_edge, 1.0 - low_edge, n_fine + 1)
+    codes = preproc._codes(bid, ask, bs, as_, preproc.grid_misc(n_fine, None, n_spread, ticksize, edges))
+    lags = {dt: preproc.transition_rows(codes, dt) for dt in dts}
+    spread = codes['spread'].astype(np.int32)
+
+    gstars, miscs = {}, {}
+    for n_imb in n_imbs:
+        width = n_fine // n_imb
+        state = spread * n_imb + codes['imb_bucket'] // width
+        for dt in dts:
+            misc = preproc.grid_misc(n_imb, dt, n_spread, ticksize, edges[::width])
+            idx, dM = lags[dt]
+            transitions = {'state':state[idx], 'next_state':state[idx + dt], 'dM':dM}
+            G1, B = mchain.estimate_codes(transitions, misc, mirror=mirror, solver=solver)[:2]
+            gstars[(n_imb, dt)] = mchain.calc_price_adj(G1, B, order=order)[0]
+            miscs[(n_imb, dt)] = misc
+    return {'Gstar':_grid_store(gstars), 'misc':miscs}
+
+def _grid_store(gstars):
+    keys = list(gstars)
+    index = pd.MultiIndex.from_tuples([k + st for k in keys for st in gstars[k].index],
+                                      names=KEY_NAMES + ['spread', 'imb_bucket'])
+    return pd.Series(np.concatenate([gstars[k].to_numpy() for k in keys]), index=index, name='Gstar')
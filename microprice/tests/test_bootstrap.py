@@ -0,0 +1,35 @@
+import warnings
+
+import numpy as np
+import pytest
+
+import src.bootstrap as bootstrap
+import src.markovchain as mchain
+
+STSPACE = {'spread':np.array([1.0]), 'imb_bucket':np.array([0.0, 1.0]), 'dM':np.array([-0.5, 0.0, 0.5])}
+
+def _counts(self_loops_only=False):
+    c = np.zeros((2, 2, 3), dtype=np.int64)
+    c[0, 0, 1], c[1, 0, 0], c[1, 1, 1] = 20, 3, 2
+    c[0, 1, 2] = 0 if self_loops_only else 1 # state 0 only stays in place: I - Q is singular
+    return c
+
+def test_singular_replicate_is_flagged_and_others_unchanged():
+    rng = np.random.default_rng(0)
+    regular = bootstrap.resample_counts(_counts(), 20, rng)
+    regular = regular[[i for i in range(20) if regular[i, 0, 1].sum() > 0]][:2]
+    batch = np.stack([regular[0], _counts(self_loops_only=True), regular[1]])
+
+    G = bootstrap.gstar_batch(batch, STSPACE)
+    assert np.isnan(G[1]).all()
+    for i in [0, 2]:
+        G1, B = mchain.estimate_counts(batch[i], STSPACE)[:2]
+        np.testing.assert_allclose(G[i], mchain.calc_price_adj(G1, B)[0].to_numpy(), atol=1e-12)
+    np.testing.assert_array_equal(G[[0, 2]], bootstrap.gstar_batch(batch[[0, 2]], STSPACE))
+
+def test_bootstrap_drops_singular_replicates_with_warning():
+    with pytest.warns(UserWarning, match='singular'):
+        table, samples = bootstrap.bootstrap(_counts(), STSPACE, nrep=200, seed=0)
+    dropped = np.isnan(samples).any(axis=1)
+    assert 0 < dropped.sum() < len(samples)
+    np.testing.assert_allclose(table[0.5], np.median(samples[~dropped], axis=0))
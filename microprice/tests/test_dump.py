@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import src.iodata as iodata
+
+@pytest.fixture
+def dump(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 500
+    stamps = pd.Timestamp('2021-04-03') + pd.to_timedelta(np.sort(rng.integers(0, 3600 * 10**9, n)), unit='ns')
+    df = pd.DataFrame({'timestamp':stamps.strftime('%Y-%m-%dD%H:%M:%S.%f000'),
+                       'symbol':rng.choice(['XBTUSD', 'ETHUSD', 'XBTM21'], n),
+                       'bidSize':rng.integers(1, 1000, n).astype(float), 'bidPrice':rng.uniform(50000, 51000, n).round(1),
+                       'askPrice':0.0, 'askSize':rng.integers(1, 1000, n).astype(float)})
+    df['askPrice'] = df['bidPrice'] + 0.5
+    path = tmp_path / 'quotes.csv.gz'
+    df.to_csv(path, index=False, compression='gzip')
+    return str(path), df
+
+WINDOWS = [(None, None), ('2021-04-03 00:10', '2021-04-03 00:40'), ('2021-04-03 00:50', None), (None, '2021-04-03 00:05')]
+
+@pytest.mark.parametrize('start, end', WINDOWS)
+def test_read_dump_chunk_boundaries(dump, start, end):
+    path, raw = dump
+    symbols = ['XBTUSD', 'ETHUSD']
+    whole = iodata.read_dump(path, symbols, start, end, chunksize=10**6)
+    ts = pd.to_datetime(raw['timestamp'].str.replace('D', 'T'), utc=True)
+    for chunksize in [7, 64, 499]:
+        chunked = iodata.read_dump(path, symbols, start, end, chunksize=chunksize)
+        for symbol in symbols:
+            pd.testing.assert_frame_equal(chunked[symbol], whole[symbol])
+    for symbol in symbols:
+        mask = (raw['symbol'] == symbol).to_numpy()
+        if start is not None:
+            mask &= (ts >= pd.Timestamp(start, tz='UTC')).to_numpy()
+        if end is not None:
+            mask &= (ts < pd.Timestamp(end, tz='UTC')).to_numpy()
+        assert len(whole[symbol]) == mask.sum() > 0
+        np.testing.assert_array_equal(whole[symbol]['bid'], raw.loc[mask, 'bidPrice'])
+        np.testing.assert_array_equal(whole[symbol].index, ts[mask])
+
+def test_split_dump_chunk_boundaries(dump, tmp_path):
+    path, raw = dump
+    names = {}
+    for chunksize in [7, 10**6]:
+        cache = str(tmp_path / 'cache-{}'.format(chunksize))
+        names[chunksize] = iodata.split_dump(path, ['XBTUSD', 'XBTM21'], cache_dir=cache, chunksize=chunksize)
+        assert sorted(names[chunksize]) == ['XBTM21-quotes', 'XBTUSD-quotes']
+    for name in names[7]:
+        small = iodata._frame_from_cache(*iodata.read_cache(str(tmp_path / 'cache-7' / name)))
+        large = iodata._frame_from_cache(*iodata.read_cache(str(tmp_path / 'cache-1000000' / name)))
+        pd.testing.assert_frame_equal(small, large)
+        assert len(small) == (raw['symbol'] == name.split('-')[0]).sum()
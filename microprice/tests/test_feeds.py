@@ -0,0 +1,82 @@
+import asyncio
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'need-cleanup'))
+import feeds
+import recorder
+
+MESSAGES = list(recorder.fake_messages(300))
+N_QUOTES = sum(len(m['data']) for m in MESSAGES if m['table'] == 'quote')
+
+async def _replay(policy, directory, maxsize=8):
+    server = await feeds.ReplayServer(MESSAGES).start()
+    handler = feeds.FeedHandler()
+    handler.add_source('bitmex', feeds.TcpSource(server.host, server.port), feeds.normalize_bitmex)
+    slow = handler.add_consumer('slow', maxsize=maxsize, policy=policy)
+    rec_queue = handler.add_consumer('recorder', maxsize=100000)
+    consumed = 0
+
+    async def consume():
+        nonlocal consumed
+        while True:
+            q = await slow.get()
+            if q is None:
+                break
+            consumed += 1
+            await asyncio.sleep(0.0005)
+
+    rec = recorder.TickRecorder(directory, batch_size=100)
+    try:
+        await asyncio.gather(handler.run(), consume(), feeds.write_quotes(rec_queue, rec))
+    finally:
+        rec.close()
+        await server.stop()
+    return handler.stats(), consumed
+
+@pytest.mark.parametrize('policy', feeds.POLICIES)
+def test_replay_overflow_policies(tmp_path, policy):
+    stats, consumed = asyncio.run(_replay(policy, str(tmp_path)))
+    slow = stats['consumers']['slow']
+    assert stats['sources']['bitmex'] == {'messages': len(MESSAGES), 'events': N_QUOTES, 'errors': 0}
+    assert slow['delivered'] == consumed + slow['depth']
+    assert slow['delivered'] + slow['dropped'] == N_QUOTES
+    if policy == 'block':
+        assert slow['dropped'] == 0
+    else:
+        assert slow['dropped'] > 0
+    assert stats['consumers']['recorder']['dropped'] == 0
+
+def test_write_quotes_round_trip(tmp_path):
+    asyncio.run(_replay('block', str(tmp_path)))
+    items = [d for m in MESSAGES if m['table'] == 'quote' for d in m['data']]
+    df = recorder.read_ticks('bitmex-XBTUSD', 'quotes', str(tmp_path))
+    assert len(df) == len(items)
+    np.testing.assert_array_equal(df.index.asi8, [feeds._iso_ns(d['timestamp']) for d in items])
+    for col in ['bidSize', 'bidPrice', 'askPrice', 'askSize']:
+        np.testing.assert_array_equal(df[col], [float(d[col]) for d in items])
+
+class _FailingRecorder(recorder.TickRecorder):
+    ''' Fails the first write only, so the error must come from an early off-loop flush. '''
+    failed = False
+    def _write(self, buffers):
+        if not self.failed:
+            self.failed = True
+            raise OSError('disk full')
+        super()._write(buffers)
+
+def test_write_quotes_raises_flush_errors(tmp_path):
+    async def run():
+        queue = asyncio.Queue()
+        async def produce():
+            for q in feeds.normalize_bitmex(MESSAGES[0]) * 20:
+                await queue.put(q)
+                await asyncio.sleep(0.01) # let the flushes finish in between
+            await queue.put(None)
+        rec = _FailingRecorder(str(tmp_path), batch_size=2, flush_interval=3600)
+        await asyncio.gather(produce(), feeds.write_quotes(queue, rec))
+    with pytest.raises(OSError, match='disk full'):
+        asyncio.run(run())
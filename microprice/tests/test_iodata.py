@@ -0,0 +1,43 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import src.iodata as iodata
+
+def _frame(n, value):
+    index = pd.date_range('2021-04-03', periods=n, freq='10ms', tz='UTC', name='timestamp')
+    return pd.DataFrame({'bid':np.full(n, value), 'ask':np.full(n, value + 1.0), 'bs':1.0, 'as':2.0}, index=index)
+
+def _write(path, value, times=5):
+    for _ in range(times):
+        iodata.write_cache(_frame(50000, value), path)
+    return value
+
+def test_concurrent_writers_of_one_entry(tmp_path):
+    path = str(tmp_path / 'XBT')
+    iodata.write_cache(_frame(50000, 0.0), path)
+    with ProcessPoolExecutor(2) as pool:
+        futures = [pool.submit(_write, path, v) for v in [1.0, 2.0]]
+        reads = 0
+        while not all(f.done() for f in futures):
+            arrays, schema = iodata.read_cache(path)
+            bid, ask = np.asarray(arrays['bid']), np.asarray(arrays['ask'])
+            assert len(bid) == len(ask) == schema['rows'] == 50000
+            assert bid[0] in (0.0, 1.0, 2.0) and np.all(bid == bid[0]) and np.all(ask == bid[0] + 1.0)
+            reads += 1
+        assert sorted(f.result() for f in futures) == [1.0, 2.0]
+    assert reads > 0
+    assert os.listdir(tmp_path) == ['XBT'] # no staging folders left behind
+    df = iodata._frame_from_cache(*iodata.read_cache(path))
+    assert df['bid'].iloc[0] in (1.0, 2.0)
+    pd.testing.assert_frame_equal(df, _frame(50000, df['bid'].iloc[0]), check_freq=False)
+
+def test_losing_writer_keeps_existing_entry(tmp_path):
+    path = str(tmp_path / 'XBT')
+    iodata.write_cache(_frame(10, 1.0), path)
+    iodata.write_cache(_frame(10, 2.0), path, overwrite=False)
+    arrays, _ = iodata.read_cache(path, ['bid'])
+    np.testing.assert_array_equal(arrays['bid'], 1.0)
+    assert os.listdir(tmp_path) == ['XBT']
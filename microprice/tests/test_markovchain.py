@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+import src.preprocess as preproc
+import src.markovchain as mchain
+from benchmarks import synthetic
+
+@pytest.fixture(scope='module')
+def chain():
+    quotes = synthetic.quotes(20000, spread_probs=(0.6, 0.3, 0.1), seed=3)
+    df, misc = preproc.discretize(quotes, 6, 1, 3)
+    return preproc.mirror(df, misc)
+
+def test_counts_engine_matches_pivot(chain):
+    counts = mchain.estimate(chain, engine='counts', solver='inv')
+    pivot = mchain.estimate(chain, engine='pivot', solver='inv')
+    for a, b in zip(counts, pivot): # G1, B, Q, Q2, R1, R2, K
+        np.testing.assert_allclose(np.asarray(a, dtype=float), np.asarray(b, dtype=float), atol=1e-12)
+
+@pytest.mark.parametrize('solver', ['lu', 'sparse'])
+def test_absorbing_solvers_match_inverse(chain, solver):
+    Q, R1, R2, K = mchain._chain_from_counts(*mchain.transition_counts(chain))
+    G1, B = mchain._absorbing_solution(Q, R1, R2, K, 'inv')
+    G1_s, B_s = mchain._absorbing_solution(Q, R1, R2, K, solver)
+    np.testing.assert_allclose(G1_s.to_numpy(), G1.to_numpy(), rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(B_s.to_numpy(), B.to_numpy(), rtol=1e-9, atol=1e-12)
+
+def test_fundamental_matches_eig(chain):
+    G1, B = mchain.estimate(chain)[:2]
+    Gstar, Bstar = mchain.calc_price_adj(G1, B, solver='fundamental')
+    Gstar_eig, Bstar_eig = mchain.calc_price_adj(G1, B, solver='eig')
+    np.testing.assert_allclose(Gstar.to_numpy(), np.real(Gstar_eig.to_numpy()), atol=1e-10)
+    np.testing.assert_allclose(Bstar.to_numpy(), np.real(np.asarray(Bstar_eig, dtype=complex)), atol=1e-10)
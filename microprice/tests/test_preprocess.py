@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+import src.preprocess as preproc
+import src.markovchain as mchain
+from benchmarks import synthetic
+
+@pytest.mark.parametrize('n, dtype', [(3, np.int8), (128, np.int8), (129, np.int16), (160, np.int16),
+                                      (2**15, np.int16), (2**15 + 1, np.int32)])
+def test_code_dtype_holds_codes(n, dtype):
+    assert preproc.code_dtype(n) == dtype
+    assert np.iinfo(dtype).min <= -1 and n - 1 <= np.iinfo(dtype).max
+
+@pytest.mark.parametrize('n_imb, n_spread', [(4, 3), (2, 160)]) # 320 states are past the int8 range
+def test_lean_matches_frame_discretization(n_imb, n_spread):
+    quotes = synthetic.quotes(100000, spread_probs=[1.0] * 160, seed=4)
+    codes, misc = preproc.discretize_lean(quotes, n_imb, 1, n_spread)
+    assert codes['state'].dtype == preproc.code_dtype(n_spread * n_imb)
+    assert codes['state'].min() >= 0
+
+    df, misc_df = preproc.discretize(quotes, n_imb, 1, n_spread)
+    assert misc['ticksize'] == misc_df['ticksize']
+    np.testing.assert_allclose(misc['imb_bucket_edges'], misc_df['imb_bucket_edges'])
+    assert len(codes['state']) == len(df)
+    state = np.rint(df['spread'] / misc['ticksize'] - 1) * n_imb + df['imb_bucket']
+    np.testing.assert_array_equal(codes['state'], state)
+
+    G1, B = mchain.estimate_codes(codes, misc)[:2]
+    G1_df, B_df = mchain.estimate(preproc.mirror(df, misc_df))[:2]
+    np.testing.assert_allclose(G1.to_numpy(), G1_df.to_numpy(), atol=1e-12)
+    np.testing.assert_allclose(B.to_numpy(), B_df.to_numpy(), atol=1e-12)
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from src.pricer import MicropricePricer
+
+def _pricer(n_imb, low_edge, n_spread=2, ticksize=0.5, seed=0):
+    rng = np.random.default_rng(seed)
+    edges = np.linspace(low_edge, 1.0 - low_edge, n_imb + 1)
+    index = pd.MultiIndex.from_product([np.arange(1, n_spread + 1) * ticksize, np.arange(n_imb, dtype=float)],
+                                       names=['spread', 'imb_bucket'])
+    Gstar = pd.Series(rng.normal(size=len(index)), index=index)
+    return MicropricePricer(Gstar, {'ticksize':ticksize, 'imb_bucket_edges':edges})
+
+def test_price_matches_price_batch_on_edges():
+    rng = np.random.default_rng(1)
+    for _ in range(500):
+        n_imb = int(rng.integers(1, 12)) * 2
+        pricer = _pricer(n_imb, rng.uniform(0.0, 0.2))
+        bs = np.r_[5000.0, pricer.edges * 1000.0, rng.uniform(0.0, 1000.0, 50)]
+        as_ = np.r_[5000.0, (1.0 - pricer.edges) * 1000.0, rng.uniform(0.0, 1000.0, 50)]
+        imb = bs / (bs + as_)
+        bs, as_ = np.r_[bs, imb], np.r_[as_, 1.0 - imb] # imbalances that are exactly representable edges
+        batch = pricer.price_batch(np.full(len(bs), 100.0), np.full(len(bs), 100.5), bs, as_)
+        single = [pricer.price(100.0, 100.5, b, a) for b, a in zip(bs, as_)]
+        np.testing.assert_array_equal(single, batch)
+
+def test_balanced_book_uses_bucket_below_half():
+    for n_imb in [2, 4, 6, 10]:
+        pricer = _pricer(n_imb, 0.03)
+        b = np.clip(np.searchsorted(pricer.edges, 0.5, side='left') - 1, 0, n_imb - 1)
+        assert pricer.price(100.0, 100.5, 5000, 5000) == 100.25 + pricer.table[0, b]
+        assert b == n_imb // 2 - 1
+
+def test_half_tick_spreads_match_price_batch():
+    pricer = _pricer(4, 0.03, n_spread=4, ticksize=0.5)
+    spreads = np.array([0.75, 1.25, 1.75]) # 1.5, 2.5 and 3.5 ticks
+    bid = np.full(len(spreads), 100.0)
+    batch = pricer.price_batch(bid, bid + spreads, np.full(len(spreads), 300.0), np.full(len(spreads), 700.0))
+    single = [pricer.price(100.0, 100.0 + s, 300.0, 700.0) for s in spreads]
+    np.testing.assert_array_equal(single, batch)
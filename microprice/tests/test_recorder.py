@@ -0,0 +1,50 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'need-cleanup'))
+import recorder
+
+def _record(tmp_path, messages, **kwargs):
+    with recorder.TickRecorder(str(tmp_path), **kwargs) as rec:
+        for msg in messages:
+            channel = {'quote':'quotes', 'trade':'trades'}[msg['table']]
+            for item in msg['data']:
+                rec.append(item['symbol'], channel, item)
+
+def test_fake_feed_round_trip(tmp_path):
+    messages = list(recorder.fake_messages(500, start='2021-02-09T23:59:00')) # crosses midnight
+    _record(tmp_path, messages, batch_size=64)
+    quotes = pd.DataFrame([d for m in messages if m['table'] == 'quote' for d in m['data']])
+    trades = pd.DataFrame([d for m in messages if m['table'] == 'trade' for d in m['data']])
+
+    q = recorder.read_ticks('XBTUSD', 'quotes', str(tmp_path))
+    assert len(os.listdir(tmp_path)) == 4 # two days of quotes and trades
+    np.testing.assert_array_equal(q.index, pd.DatetimeIndex(quotes['timestamp']))
+    for col in ['bidSize', 'bidPrice', 'askPrice', 'askSize']:
+        np.testing.assert_array_equal(q[col], quotes[col].astype(float))
+
+    t = recorder.read_ticks('XBTUSD', 'trades', str(tmp_path))
+    np.testing.assert_array_equal(t.index, pd.DatetimeIndex(trades['timestamp']))
+    assert list(t['side']) == list(trades['side'])
+    assert list(t['trdMatchID']) == list(trades['trdMatchID'])
+    np.testing.assert_array_equal(t['price'], trades['price'])
+
+def test_quiet_period_is_flushed_by_timer(tmp_path):
+    rec = recorder.TickRecorder(str(tmp_path), batch_size=10**6, flush_interval=0.05)
+    try:
+        item = next(recorder.fake_messages(1))['data'][0]
+        rec.append(item['symbol'], 'quotes', item)
+        time.sleep(0.3)
+        assert len(recorder.read_ticks('XBTUSD', 'quotes', str(tmp_path))) == 1
+    finally:
+        rec.close()
+
+def test_close_writes_buffered_items(tmp_path):
+    messages = list(recorder.fake_messages(20))
+    _record(tmp_path, messages, batch_size=10**6, flush_interval=3600)
+    n = sum(len(m['data']) for m in messages if m['table'] == 'quote')
+    assert len(recorder.read_ticks('XBTUSD', 'quotes', str(tmp_path))) == n
@@ -0,0 +1,23 @@
+import numpy as np
+
+import src.preprocess as preproc
+import src.markovchain as mchain
+import src.streaming as streaming
+from benchmarks import synthetic
+
+def test_rolling_window_push_matches_batch_fit():
+    quotes = synthetic.quotes(6000, ticksize=0.01, seed=5)
+    misc = preproc.grid_misc(4, 1, 3, 0.01)
+    window = 1500
+    est = streaming.RollingEstimator(misc, window=window, refresh_every=1000)
+    for bid, ask, bs, as_ in quotes[['bid', 'ask', 'bs', 'as']].itertuples(index=False):
+        est.push(bid, ask, bs, as_)
+    est.refresh()
+    assert est.stats['factorize'] < est.stats['refresh'] # the LU factorization was reused
+
+    trans = preproc.transition_codes(preproc.discretize_codes(quotes, misc), misc)
+    last = {k: v[-window:] for k, v in trans.items()} # the ring buffer evicted everything older
+    G1, B = mchain.estimate_codes(last, misc)[:2]
+    np.testing.assert_allclose(est.G1.to_numpy(), G1.to_numpy(), rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(est.B.to_numpy(), B.to_numpy(), rtol=1e-9, atol=1e-12)
+    np.testing.assert_array_equal(est.G1.index, G1.index)
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+import src.preprocess as preproc
+import src.markovchain as mchain
+import src.sweep as sweep
+from benchmarks import synthetic
+
+QUOTES = synthetic.quotes(20000, seed=2)
+
+def test_sweep_matches_discretize_per_grid():
+    out = sweep.sweep(QUOTES, (2, 3, 4), (1, 2), 3)
+    for n_imb in (2, 3, 4):
+        for dt in (1, 2):
+            df, misc = preproc.discretize(QUOTES, n_imb, dt, 3)
+            G1, B = mchain.estimate(preproc.mirror(df, misc))[:2]
+            Gstar = mchain.calc_price_adj(G1, B)[0]
+            np.testing.assert_allclose(out['Gstar'].loc[n_imb, dt].to_numpy(), Gstar.to_numpy(), atol=1e-10)
+
+@pytest.mark.parametrize('n_imbs', [(7, 9, 10, 11, 13), tuple(range(2, 21))])
+def test_sweep_refuses_fine_grid_above_max_fine(n_imbs):
+    assert sweep.fine_grid(n_imbs) > sweep.MAX_FINE
+    with pytest.raises(ValueError, match='exceeds'):
+        sweep.sweep(QUOTES, n_imbs, (1,), 3)
+
+def test_sweep_explicit_n_fine_above_max_fine():
+    with pytest.raises(ValueError, match='exceeds'):
+        sweep.sweep(QUOTES, (2,), (1,), 3, n_fine=2 * (sweep.MAX_FINE // 2 + 1))